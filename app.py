@@ -1,8 +1,12 @@
 # app.py
 import streamlit as st
 import pandas as pd
+import copy
+import hashlib
+import io
 import os
 import sys
+import time
 
 # Add the 'modules' folder to Python path
 MODULES_PATH = os.path.join(os.path.dirname(__file__), "modules")
@@ -14,6 +18,56 @@ from backend.query_processor import QueryProcessor
 from backend.data_handler import DataHandler
 from backend.voice_input import get_voice_input
 from backend.response_generator import ResponseGenerator
+from backend.search_engine import paginate
+from config import UI
+
+# Cached resources rebuilt during this rerun and their build time; everything else was reused
+rebuilt = {}
+
+@st.cache_resource
+def load_query_processor():
+    """Load the embedding model once per process."""
+    start_time = time.time()
+    processor = QueryProcessor()
+    rebuilt["Query processor"] = time.time() - start_time
+    return processor
+
+@st.cache_resource
+def load_responder():
+    """Load the local LLM once per process."""
+    start_time = time.time()
+    responder = ResponseGenerator()
+    rebuilt["Response generator"] = time.time() - start_time
+    return responder
+
+@st.cache_resource(max_entries=4)
+def load_dataset(content_hash, _file_bytes, _processor):
+    """
+    Parse an uploaded CSV and learn its entities once per distinct file content.
+    Arguments prefixed with an underscore are not hashed by Streamlit, so the
+    cache is keyed by the content hash alone.
+
+    Each dataset gets its own copy of the processor, sharing the embedding model,
+    so sessions on different datasets never swap entity state under each other.
+    """
+    start_time = time.time()
+    df = pd.read_csv(io.BytesIO(_file_bytes))
+    handler = DataHandler(df=df)
+    processor = copy.copy(_processor)
+    processor.set_entity_state(None)
+    processor.learn_from_data(df)
+    rebuilt["Dataset"] = time.time() - start_time
+    return df, handler, processor
+
+def show_cache_panel():
+    """Show which cached resources were reused or rebuilt on this rerun."""
+    with st.sidebar:
+        st.markdown("### ⚡ Cache")
+        for name in ["Query processor", "Response generator", "Dataset"]:
+            if name in rebuilt:
+                st.write(f"🔨 {name}: rebuilt in {rebuilt[name]:.2f}s")
+            else:
+                st.write(f"♻️ {name}: reused")
 
 # Streamlit UI Setup
 st.title("🏅 Olympic Voice Assistant")
@@ -22,7 +76,12 @@ st.subheader("Ask questions about athletes, countries, and events")
 # Upload CSV
 uploaded_file = st.file_uploader("Upload your Olympic dataset", type="csv")
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    # Initialize processors, reusing models and dataset state across reruns
+    responder = load_responder()
+    file_bytes = uploaded_file.getvalue()
+    df, handler, processor = load_dataset(hashlib.sha256(file_bytes).hexdigest(), file_bytes, load_query_processor())
+    show_cache_panel()
+
     st.success("✅ Dataset loaded")
     
     # Add debugging information
@@ -32,25 +91,19 @@ if uploaded_file is not None:
     st.write("Sample Data:")
     st.dataframe(df.head())
 
-    # Initialize processors
-    processor = QueryProcessor()
-    handler = DataHandler(df=df)
-    responder = ResponseGenerator()
-
-    # Learn from data
-    processor.learn_from_data(df)
-
     if st.button("🎙️ Speak"):
         with st.spinner("Listening..."):
             user_query = get_voice_input()
             if user_query:
                 st.write(f"🗣️ You said: `{user_query}`")
-                query_params = processor.process_query(user_query, df=df)
+                query_params = processor.process_query(user_query)
                 results, analysis_info = handler.search_data(query_params)
 
                 st.markdown("### 🔍 Results")
                 if not results.empty:
-                    st.dataframe(results.head())
+                    page = paginate(results, page_size=UI["max_displayed_results"])
+                    st.dataframe(page['rows'])
+                    st.caption(f"Showing {len(page['rows'])} of {page['total']} rows")
                 else:
                     st.info("No results found.")
 
@@ -0,0 +1,95 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import STATISTICS
+
+
+class ColumnStats:
+    def __init__(self, series, settings):
+        """
+        Summarize one column for selectivity estimates.
+
+        The most common values are kept with exact counts. The remaining rows are
+        described by a sample of their distinct values, for substring predicates.
+        Range predicates are counted exactly on DataHandler's sorted indexes.
+
+        Args:
+            series (Series): Column values
+            settings (dict): Catalog settings, see STATISTICS in config.py
+        """
+        self.dtype = str(series.dtype)
+        self.rows = len(series)
+        self.null_count = int(series.isna().sum())
+        self.numeric = pd.api.types.is_numeric_dtype(series)
+
+        counts = series.value_counts(dropna=True)
+        self.cardinality = len(counts)
+        common = counts.head(settings["most_common_values"])
+        self.most_common = dict(zip(common.index.tolist(), common.tolist()))
+        self.rest_rows = self.rows - self.null_count - int(common.sum())
+
+        rest_values = counts.index[len(common):]
+        n_sample = min(len(rest_values), settings["distinct_sample"])
+        if n_sample < len(rest_values):
+            rest_sample = rest_values[np.random.default_rng(0).choice(len(rest_values), n_sample, replace=False)]
+        else:
+            rest_sample = rest_values
+        self.sample = [str(value) for value in rest_sample]
+
+    def contains_rows(self, term, case=True):
+        """Estimate the rows whose string value contains term."""
+        if not case:
+            term = term.lower()
+        matches = lambda value: term in (str(value) if case else str(value).lower())
+
+        rows = sum(count for value, count in self.most_common.items() if matches(value))
+        if self.sample:
+            rows += self.rest_rows * sum(map(matches, self.sample)) / len(self.sample)
+        return rows
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the most common values and the sample in bytes."""
+        total = sys.getsizeof(self.most_common) + sys.getsizeof(self.sample)
+        total += sum(sys.getsizeof(value) + sys.getsizeof(count) for value, count in self.most_common.items())
+        return total + sum(sys.getsizeof(value) for value in self.sample)
+
+    def summary(self):
+        return {
+            'dtype': self.dtype,
+            'null_count': self.null_count,
+            'cardinality': self.cardinality,
+            'most_common': {str(value): count for value, count in list(self.most_common.items())[:5]}
+        }
+
+
+class StatisticsCatalog:
+    def __init__(self, df, settings=None):
+        """
+        Per-column statistics of a frame, built once at load time and used by
+        DataHandler.search_data to order filters by estimated selectivity.
+
+        Args:
+            df (DataFrame): Loaded data
+            settings (dict, optional): Overrides for config.STATISTICS
+        """
+        start_time = time.time()
+        settings = {**STATISTICS, **(settings or {})}
+        self.rows = len(df)
+        self.columns = {col: ColumnStats(df[col], settings) for col in df.columns}
+        print(f"Column statistics built in {time.time() - start_time:.2f} seconds")
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the catalog in bytes."""
+        return sum(stats.nbytes for stats in self.columns.values())
+
+    def summary(self):
+        """Return cardinality, null counts and top values per column."""
+        return {col: stats.summary() for col, stats in self.columns.items()}
@@ -1,19 +1,62 @@
 # backend/data_handler.py
 import pandas as pd
 import numpy as np
+import json
+import re
 import time
 from fuzzywuzzy import fuzz, process
+from config import SEARCH
+from .column_stats import StatisticsCatalog
+from .sql_store import SQLiteStore
+
+
+def search_key(query_params):
+    """
+    Key identifying the rows search_data returns for a set of query parameters,
+    so results computed for one query can be reused for another that resolves
+    to the same search.
+
+    Args:
+        query_params (dict): Parameters from QueryProcessor.process_query
+
+    Returns:
+        str: Canonical JSON of the fields search_data reads
+    """
+    fields = {key: query_params.get(key) for key in ('intent', 'filters', 'follow_up', 'limit', 'ascending')}
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+def _page(rows, columns, total, start, keyset):
+    """Describe one page of results starting at position start of total rows."""
+    end = start + len(rows)
+    has_more = end < total
+    return {
+        'rows': rows,
+        'columns': columns,
+        'total': total,
+        'next_offset': end if has_more else None,
+        'next_cursor': int(rows.index[-1]) if has_more and keyset and len(rows) else None
+    }
+
 
 class DataHandler:
-    def __init__(self, csv_path=None, df=None):
+    def __init__(self, csv_path=None, df=None, engine="pandas", db_path=None):
         """
         Initialize the DataHandler with either a CSV path or a DataFrame.
         Args:
             csv_path (str, optional): Path to the CSV file
             df (DataFrame, optional): Pandas DataFrame with the data
+            engine (str): "pandas" to hold the data in memory, "sqlite" to keep it in an
+                on-disk SQLite database for datasets larger than RAM
+            db_path (str, optional): SQLite database path for the "sqlite" engine
         """
         start_time = time.time()
-        if df is not None:
+        self.engine = engine
+        self.store = None
+        if engine == "sqlite":
+            self.store = SQLiteStore(db_path=db_path, csv_path=csv_path, df=df)
+            self.df = None
+        elif df is not None:
             self.df = df
         elif csv_path:
             print("Loading CSV file...")
@@ -22,25 +65,40 @@ class DataHandler:
         else:
             self.df = None
 
+        # Frames passed in belong to the caller and are never converted in place
+        self.owns_df = self.df is not None and df is None
         self.data_schema = {}
-        if self.df is not None:
+        # Sorted position indexes of numeric columns, built on first use
+        self.sorted_indexes = {}
+        self._indexed_df = None
+        self._statistics = None
+        self._statistics_df = None
+        if self.df is not None or self.store is not None:
             self._analyze_schema()
         print(f"DataHandler initialization completed in {time.time() - start_time:.2f} seconds")
 
     def _analyze_schema(self):
         """Analyze the schema of the loaded DataFrame."""
-        if self.df is None:
+        if self.store is not None:
+            df = self.store.sample()
+            shape = (self.store.row_count(), len(self.store.columns))
+        elif self.df is not None:
+            df = self.df
+            shape = self.df.shape
+        else:
             return
 
-        cols = self.df.columns.tolist()
+        cols = df.columns.tolist()
         self.data_schema = {
-            'columns': {col: str(self.df[col].dtype) for col in cols},
-            'shape': self.df.shape,
+            'columns': {col: str(df[col].dtype) for col in cols},
+            'shape': shape,
             'has_country': 'Country' in cols or 'Team' in cols,
             'has_athlete': 'Athlete' in cols or 'Name' in cols,
             'has_year': any('year' in col.lower() for col in cols),
             'medal_columns': [col for col in cols if 'medal' in col.lower() or col in ['Gold', 'Silver', 'Bronze', 'Total']]
         }
+        if self.df is not None:
+            self.data_schema['statistics'] = self.statistics().summary()
 
     def fuzzy_search_column(self, column, search_term, threshold=70):
         """Perform fuzzy search on a column."""
@@ -64,9 +122,71 @@ class DataHandler:
 
         return list(set(matches))
 
+    def compact_columns(self, columns):
+        """
+        Store entity columns as categoricals, so the frame keeps each name once in its
+        dictionary rather than once per row. The entity store keeps a second copy of the
+        names. Only frames this handler loaded itself are converted; a frame passed in
+        by the caller keeps its dtypes.
+        Args:
+            columns (iterable): Names of the columns to convert
+        """
+        if not self.owns_df:
+            return
+        for col in columns:
+            values = self.df[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                before = values.memory_usage(deep=True)
+                self.df[col] = values.astype('category')
+                print(f"Column '{col}' stored as categorical: {before / 2**20:.1f} MB -> "
+                      f"{self.df[col].memory_usage(deep=True) / 2**20:.1f} MB in the frame, "
+                      f"plus the entity store's own copy of the names")
+
+    def entity_frame(self):
+        """
+        Return a frame holding the entity values QueryProcessor.learn_from_data needs.
+        Returns:
+            DataFrame: The full data for the pandas engine, distinct entity rows for SQLite
+        """
+        if self.store is not None:
+            return self.store.entity_frame()
+        return self.df
+
+    def iter_search_data(self, query_params, chunksize=None):
+        """
+        Search data and stream the results back in chunks.
+        Args:
+            query_params (dict): Dictionary of search parameters
+            chunksize (int, optional): Rows per chunk
+        Yields:
+            DataFrame: Chunks of the filtered results, a single empty frame with the
+                dataset's columns if nothing matched
+        """
+        if self.store is not None:
+            empty = True
+            for chunk in self.store.iter_query(query_params, chunksize=chunksize):
+                empty = False
+                yield chunk
+            if empty:
+                yield pd.DataFrame(columns=self.store.columns)
+            return
+
+        results, _ = self.search_data(query_params)
+        if results.empty:
+            yield results
+            return
+        chunksize = chunksize or max(len(results), 1)
+        for start in range(0, len(results), chunksize):
+            yield results.iloc[start:start + chunksize]
+
     def search_data(self, query_params):
         """
         Search data based on query parameters from QueryProcessor.
+
+        Filters run in order of estimated selectivity. Numeric predicates use a
+        sorted index when it is expected to touch fewer rows than scanning the
+        rows still selected. With query_params['explain'] set, the info dict also
+        holds the plan with estimated and actual row counts and step timings.
         Args:
             query_params (dict): Dictionary of search parameters
         Returns:
@@ -74,59 +194,349 @@ class DataHandler:
             dict: Additional information (if any)
         """
         start_time = time.time()
+        if self.store is not None:
+            return self._search_store(query_params, start_time)
         if self.df is None:
             return pd.DataFrame(), {"error": "No data loaded"}
 
-        results = self.df.copy()
-        filters = query_params.get('filters', {})
-
-        # Country filter
-        if 'country' in filters and ('Country' in results.columns or 'Team' in results.columns):
-            col = 'Team' if 'Team' in results.columns else 'Country'
-            results = results[results[col].str.contains(filters['country'], case=False, na=False)]
-
-        # City filter
-        if 'city' in filters and 'City' in results.columns:
-            results = results[results['City'].str.contains(filters['city'], case=False, na=False)]
-
-        # Year filter
-        if 'year' in filters and any('year' in col.lower() for col in results.columns):
-            year_col = next(col for col in results.columns if 'year' in col.lower())
-            results = results[results[year_col].astype(str).str.contains(filters['year'], na=False)]
-
-        # Athlete filter
-        if 'athlete' in filters and ('Name' in results.columns or 'Athlete' in results.columns):
-            name_col = 'Name' if 'Name' in results.columns else 'Athlete'
-            results = results[results[name_col].str.contains(filters['athlete'], case=False, na=False)]
-
-        # Medal type filter
-        if 'medal_type' in filters:
-            medal_type = filters['medal_type']
-            medal_col = None
-            if 'Medal' in results.columns:
-                medal_col = 'Medal'
-            elif medal_type in results.columns:
-                medal_col = medal_type
-            elif 'Gold' in results.columns and medal_type == 'gold':
-                results = results[results['Gold'] > 0]
-            elif 'Silver' in results.columns and medal_type == 'silver':
-                results = results[results['Silver'] > 0]
-            elif 'Bronze' in results.columns and medal_type == 'bronze':
-                results = results[results['Bronze'] > 0]
+        positions, plan, _ = self._select(query_params)
+        results = self.df.copy() if positions is None else self.df.iloc[positions]
+
+        print(f"Data search completed in {time.time() - start_time:.2f} seconds")
+        info = {"empty": True} if results.empty else {"record_count": len(results)}
+        if query_params.get('explain'):
+            info['plan'] = self._explain(plan, len(results), time.time() - start_time)
+        return results, info
+
+    def search_page(self, query_params, page_size=None, offset=0, cursor=None, row_ids=False):
+        """
+        Search data and build only one page of the results.
+
+        The total comes from the selected row positions (or a COUNT for SQLite),
+        so rows outside the page are never materialized. When the results keep
+        the dataset's row order, the cursor is the row id of the last row already
+        returned and the page starts right after it (keyset pagination). Ranked
+        results are paged by offset.
+        Args:
+            query_params (dict): Dictionary of search parameters
+            page_size (int, optional): Rows per page, defaults to SEARCH['page_size']
+            offset (int): Position of the first row of the page
+            cursor (int, optional): Row id of the last row of the previous page
+            row_ids (bool): Also return the positions of every result row, e.g. for a session
+        Returns:
+            dict: Page rows, columns, total row count, the offset/cursor of the next page
+                and, if requested, 'row_ids'
+            dict: Additional information (if any)
+        """
+        start_time = time.time()
+        page_size = page_size or SEARCH['page_size']
+        if self.store is not None:
+            return self._search_store_page(query_params, page_size, offset, cursor, row_ids, start_time)
+        if self.df is None:
+            return {'rows': pd.DataFrame(), 'columns': [], 'total': 0, 'next_offset': None,
+                    'next_cursor': None, 'row_ids': np.zeros(0, dtype=np.int64)}, {"error": "No data loaded"}
+
+        positions, plan, ranked = self._select(query_params)
+        if positions is None:
+            positions = np.arange(len(self.df))
+        total = len(positions)
+        keyset = not ranked and self.df.index.is_monotonic_increasing
+        if cursor is not None and keyset:
+            start = int(self.df.index[positions].searchsorted(cursor, side='right'))
+        else:
+            start = offset
+        rows = self.df.iloc[positions[start:start + page_size]]
+        page = _page(rows, list(self.df.columns), total, start, keyset)
+        if row_ids:
+            page['row_ids'] = positions
+
+        print(f"Data search completed in {time.time() - start_time:.2f} seconds")
+        info = {"empty": True} if not total else {"record_count": total}
+        if query_params.get('explain'):
+            info['plan'] = self._explain(plan, total, time.time() - start_time)
+        return page, info
+
+    def _select(self, query_params):
+        """
+        Run the filter plan and ranking over row positions, without building rows.
+        Args:
+            query_params (dict): Dictionary of search parameters
+        Returns:
+            ndarray or None: Positions of the result rows in result order, None for every row
+            list: Executed plan steps
+            bool: Whether the results are ranked rather than in dataset order
+        """
+        # Follow-up queries start from the rows of the previous turn
+        positions = query_params.get('row_ids')     # Selected row positions, None while every row is selected
+        if positions is not None:
+            positions = np.sort(np.asarray(positions, dtype=np.int64))
+        plan = self.plan_search(query_params.get('filters', {}), rows=None if positions is None else len(positions))
+        for step in plan:
+            step_start = time.time()
+            if step['path'] == 'index':
+                step_positions = np.sort(self._range_positions(step['column'], step['predicates']))
+                positions = step_positions if positions is None else np.intersect1d(positions, step_positions, assume_unique=True)
+            else:
+                values = self.df[step['column']] if positions is None else self.df[step['column']].iloc[positions]
+                mask = step['mask'](values).to_numpy(dtype=bool)
+                positions = np.flatnonzero(mask) if positions is None else positions[mask]
+            step['actual_rows'] = len(positions)
+            step['seconds'] = round(time.time() - step_start, 4)
 
         # Ranking intent
+        ranked = False
         if query_params.get('intent') == 'ranking':
-            medal_col = next((col for col in ['Gold', 'Silver', 'Bronze', 'Total'] if col in results.columns), None)
+            medal_col = next((col for col in ['Gold', 'Silver', 'Bronze', 'Total'] if col in self.df.columns), None)
             if medal_col:
-                ascending = query_params.get('ascending', False)
-                results = results.sort_values(by=medal_col, ascending=ascending)
-                limit = query_params.get('limit', 10)
-                results = results.head(limit)
+                if positions is None:
+                    positions = np.arange(len(self.df))
+                values = pd.Series(self.df[medal_col].to_numpy()[positions])
+                order = values.sort_values(ascending=query_params.get('ascending', False)).index.to_numpy()
+                positions = positions[order][:query_params.get('limit', 10)]
+                ranked = True
+        return positions, plan, ranked
 
-        # If no results found
-        if results.empty:
-            print(f"Data search completed in {time.time() - start_time:.2f} seconds")
-            return results, {"empty": True}
+    def row_positions(self, results):
+        """
+        Return the positions in the dataset of the rows of a search result.
+        Args:
+            results (DataFrame): Frame returned by search_data
+        Returns:
+            ndarray: Row positions, usable as query_params['row_ids']
+        """
+        if self.store is None and self.df is None:
+            return np.zeros(0, dtype=np.int64)
+        # Results are labelled with their positions for SQLite and default-indexed frames
+        if self.store is not None or self.df.index.equals(pd.RangeIndex(len(self.df))):
+            return results.index.to_numpy(dtype=np.int64)
+        return self.df.index.get_indexer(results.index)
+
+    def numeric_column(self, field, columns=None):
+        """
+        Resolve a numeric range field ('year', 'age', 'height', 'weight') to a column.
+        Args:
+            field (str): Field name used in query_params['filters']['ranges']
+            columns (list, optional): Columns to search, defaults to the frame's
+        Returns:
+            str or None: Matching numeric column
+        """
+        columns = columns if columns is not None else self.df.columns
+        if field == 'year':
+            col = next((c for c in columns if 'year' in c.lower()), None)
+        else:
+            col = next((c for c in columns if c.lower() == field), None)
+        if col is None or (self.df is not None and not pd.api.types.is_numeric_dtype(self.df[col])):
+            return None
+        return col
+
+    def _sorted_index(self, col):
+        """Return (sorted values, row positions) for a numeric column, building it once."""
+        if self._indexed_df is not self.df:
+            self.sorted_indexes = {}
+            self._indexed_df = self.df
+        if col not in self.sorted_indexes:
+            values = self.df[col].to_numpy(dtype=float)
+            positions = np.flatnonzero(~np.isnan(values))
+            positions = positions[np.argsort(values[positions], kind='stable')]
+            self.sorted_indexes[col] = (values[positions], positions)
+        return self.sorted_indexes[col]
+
+    def build_sorted_indexes(self):
+        """Build the sorted indexes of all numeric columns now instead of on the first range query."""
+        if self.df is None:
+            return
+        for col in self.df.columns:
+            if pd.api.types.is_numeric_dtype(self.df[col]):
+                self._sorted_index(col)
+
+    @property
+    def nbytes(self):
+        """Memory held by the frame, its sorted indexes and its column statistics in bytes."""
+        if self.df is None:
+            return 0
+        total = int(self.df.memory_usage(deep=True).sum())
+        total += sum(values.nbytes + positions.nbytes for values, positions in self.sorted_indexes.values())
+        if self._statistics is not None:
+            total += self._statistics.nbytes
+        return total
+
+    def _range_positions(self, col, predicates):
+        """Row positions satisfying every predicate on a column, via binary search."""
+        lo, hi = self._range_bounds(col, predicates)
+        positions = self._sorted_index(col)[1]
+        return positions[lo:hi] if lo < hi else positions[:0]
+
+    def _range_bounds(self, col, predicates):
+        """Bounds in the sorted index of the rows satisfying every predicate on a column."""
+        sorted_values, _ = self._sorted_index(col)
+        lo, hi = 0, len(sorted_values)
+        for op, value in predicates:
+            if op in ('>=', '=='):
+                lo = max(lo, np.searchsorted(sorted_values, value, side='left'))
+            if op == '>':
+                lo = max(lo, np.searchsorted(sorted_values, value, side='right'))
+            if op in ('<=', '=='):
+                hi = min(hi, np.searchsorted(sorted_values, value, side='right'))
+            if op == '<':
+                hi = min(hi, np.searchsorted(sorted_values, value, side='left'))
+        return lo, hi
+
+    def plan_search(self, filters, rows=None):
+        """
+        Turn filters into steps ordered by estimated selectivity, each with its access path.
+        Args:
+            filters (dict): query_params['filters']
+            rows (int, optional): Rows the search starts from, defaults to the whole frame
+        Returns:
+            list: Steps with step, column, predicate, path and estimated_rows (rows left after it)
+        """
+        columns = self.df.columns
+        steps = []
+
+        def scan(name, col, predicate, mask, estimate):
+            steps.append({'step': name, 'column': col, 'predicate': predicate, 'mask': mask, 'estimate': estimate})
+
+        # Numeric predicates, grouped by column so each is one binary search
+        index_predicates = {}
+        for field, field_predicates in filters.get('ranges', {}).items():
+            col = self.numeric_column(field)
+            if col:
+                index_predicates.setdefault(col, []).extend(field_predicates)
+
+        country_col = 'Team' if 'Team' in columns else ('Country' if 'Country' in columns else None)
+        if 'country' in filters and country_col:
+            term = filters['country']
+            scan('country', country_col, f"contains {term!r}",
+                 lambda values, term=term: values.str.contains(term, case=False, na=False),
+                 self._estimate_contains(country_col, term, case=False))
+
+        if 'city' in filters and 'City' in columns:
+            term = filters['city']
+            scan('city', 'City', f"contains {term!r}",
+                 lambda values, term=term: values.str.contains(term, case=False, na=False),
+                 self._estimate_contains('City', term, case=False))
+
+        year_col = next((col for col in columns if 'year' in col.lower()), None)
+        if 'year' in filters and year_col:
+            term = str(filters['year'])
+            if self.numeric_column('year') and re.fullmatch(r'\d{4}', term):
+                # A four-digit year on a numeric year column is an exact match
+                index_predicates.setdefault(year_col, []).append(('==', float(term)))
+            else:
+                scan('year', year_col, f"contains {term!r}",
+                     lambda values, term=term: values.astype(str).str.contains(term, na=False),
+                     self._estimate_contains(year_col, term))
+
+        name_col = 'Name' if 'Name' in columns else ('Athlete' if 'Athlete' in columns else None)
+        if 'athlete' in filters and name_col:
+            term = filters['athlete']
+            scan('athlete', name_col, f"contains {term!r}",
+                 lambda values, term=term: values.str.contains(term, case=False, na=False),
+                 self._estimate_contains(name_col, term, case=False))
+
+        # Medal type: a 'Medal' column or a column named after the medal type leaves rows as they are
+        medal_type = filters.get('medal_type')
+        if medal_type and 'Medal' not in columns and medal_type not in columns:
+            medal_col = {'gold': 'Gold', 'silver': 'Silver', 'bronze': 'Bronze'}.get(medal_type)
+            if medal_col in columns:
+                if pd.api.types.is_numeric_dtype(self.df[medal_col]):
+                    index_predicates.setdefault(medal_col, []).append(('>', 0))
+                else:
+                    scan('medal', medal_col, "> 0", lambda values: values > 0, len(self.df))
+
+        for col, predicates in index_predicates.items():
+            steps.append({
+                'step': 'range', 'column': col, 'predicates': predicates,
+                'predicate': " and ".join(f"{op} {value:g}" for op, value in predicates),
+                'estimate': self._estimate_range(col, predicates)
+            })
+
+        # Most selective first; use an index when it touches fewer rows than a scan would
+        total = len(self.df)
+        steps.sort(key=lambda step: step['estimate'])
+        remaining = total if rows is None else rows
+        for step in steps:
+            step['path'] = 'index' if 'predicates' in step and step['estimate'] < remaining else 'scan'
+            if step['path'] == 'scan' and 'mask' not in step:
+                predicates = step['predicates']
+                step['mask'] = lambda values, predicates=predicates: self._compare(values, predicates)
+            # Predicates are assumed independent
+            remaining = remaining * step['estimate'] / total if total else 0
+            step['estimated_rows'] = round(remaining, 1)
+        return steps
+
+    @staticmethod
+    def _compare(values, predicates):
+        """Evaluate (operator, value) predicates on a column slice."""
+        ops = {'>': '__gt__', '>=': '__ge__', '<': '__lt__', '<=': '__le__', '==': '__eq__'}
+        mask = pd.Series(True, index=values.index)
+        for op, value in predicates:
+            mask &= getattr(values, ops[op])(value)
+        return mask
+
+    def _estimate_contains(self, col, term, case=True):
+        statistics = self.statistics()
+        return statistics[col].contains_rows(term, case=case) if statistics else len(self.df)
+
+    def _estimate_range(self, col, predicates):
+        # Two binary searches on the sorted index count the rows exactly
+        lo, hi = self._range_bounds(col, predicates)
+        return max(hi - lo, 0)
+
+    def statistics(self):
+        """Return the column statistics catalog of the loaded frame, building it when the frame changes."""
+        if self.df is None:
+            return None
+        if self._statistics_df is not self.df:
+            self._statistics = StatisticsCatalog(self.df)
+            self._statistics_df = self.df
+        return self._statistics
+
+    @staticmethod
+    def _explain(plan, result_rows, seconds):
+        """Describe an executed plan for the 'explain' option."""
+        keys = ('step', 'column', 'predicate', 'path', 'estimated_rows', 'actual_rows', 'seconds')
+        return {
+            'steps': [{key: step[key] for key in keys} for step in plan],
+            'estimated_rows': plan[-1]['estimated_rows'] if plan else None,
+            'result_rows': result_rows,
+            'seconds': round(seconds, 4)
+        }
+
+    def _search_store_page(self, query_params, page_size, offset, cursor, row_ids, start_time):
+        """Run search_page against the SQLite store, fetching only the page's rows."""
+        keyset = not self.store.is_ranked(query_params)
+        after = cursor if cursor is not None and keyset else None
+        rows = self.store.page(query_params, page_size, offset=0 if after is not None else offset, after=after)
+        total = self.store.count(query_params)
+        if after is not None:
+            # Rows at or before the cursor precede the page
+            offset = self.store.count(query_params, until=after)
+        page = _page(rows, self.store.columns, total, offset, keyset)
+        if row_ids:
+            page['row_ids'] = self.store.row_ids(query_params)
+
+        print(f"Data search completed in {time.time() - start_time:.2f} seconds")
+        info = {"empty": True} if not total else {"record_count": total}
+        if query_params.get('explain'):
+            info['plan'] = {
+                'steps': [{'step': 'sqlite', 'detail': detail} for detail in self.store.explain(query_params)],
+                'result_rows': total,
+                'seconds': round(time.time() - start_time, 4)
+            }
+        return page, info
+
+    def _search_store(self, query_params, start_time):
+        """Run search_data against the SQLite store, collecting the streamed chunks."""
+        chunks = list(self.store.iter_query(query_params))
+        results = pd.concat(chunks) if chunks else pd.DataFrame(columns=self.store.columns)
 
         print(f"Data search completed in {time.time() - start_time:.2f} seconds")
-        return results, {"record_count": len(results)}
\ No newline at end of file
+        info = {"empty": True} if results.empty else {"record_count": len(results)}
+        if query_params.get('explain'):
+            info['plan'] = {
+                'steps': [{'step': 'sqlite', 'detail': detail} for detail in self.store.explain(query_params)],
+                'result_rows': len(results),
+                'seconds': round(time.time() - start_time, 4)
+            }
+        return results, info
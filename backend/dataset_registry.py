@@ -0,0 +1,208 @@
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import EMBEDDING, RESIDENCY
+from .data_handler import DataHandler
+from .entity_store import load_entity_state, save_entity_state
+from .shared_entities import dataset_key
+
+
+class DatasetRegistry:
+    def __init__(self, query_processor, memory_budget_mb=None, spill_dir=None, shared_cache=None):
+        """
+        Keep several datasets resident within a memory budget, evicting the least
+        recently used ones to disk and reloading them on demand.
+
+        Args:
+            query_processor (QueryProcessor): Shared processor whose entity state is swapped per dataset
+            memory_budget_mb (float, optional): Memory budget for resident datasets in MB
+            spill_dir (str, optional): Directory where evicted datasets are spilled
+            shared_cache (SharedEntityCache, optional): Where entity state of CSV datasets is
+                published once and mapped by every worker process
+        """
+        self.query_processor = query_processor
+        self.shared_cache = shared_cache
+        budget_mb = memory_budget_mb if memory_budget_mb is not None else RESIDENCY["memory_budget_mb"]
+        self.memory_budget = int(budget_mb * 1024 * 1024)
+        self.spill_dir = spill_dir or RESIDENCY["spill_dir"]
+
+        # name -> {'handler', 'entity_state', 'bytes'}, ordered from coldest to hottest
+        self.resident = OrderedDict()
+        # name -> {'csv_path', 'spill_path'} for every known dataset
+        self.sources = {}
+        self.active = None
+        self.counters = {'hits': 0, 'misses': 0, 'loads': 0, 'reloads': 0, 'evictions': 0}
+
+    def register(self, name, csv_path=None, df=None):
+        """
+        Register a dataset and make it resident.
+
+        Args:
+            name (str): Dataset name
+            csv_path (str, optional): Path to the CSV file
+            df (DataFrame, optional): Pandas DataFrame with the data
+        """
+        if name in self.sources:
+            self.evict(name, spill=False)
+        # Versions identify CSV contents; frames passed in directly have none
+        version = dataset_key(csv_path) if csv_path and df is None else None
+        self.sources[name] = {
+            'csv_path': csv_path, 'spill_path': None, 'version': version,
+            'shared_key': version if self.shared_cache is not None else None
+        }
+        self._load(name, df=df)
+
+    def activate(self, name):
+        """
+        Make a dataset current, reloading it if it was evicted.
+
+        Args:
+            name (str): Dataset name
+
+        Returns:
+            DataHandler: Handler for the dataset
+        """
+        if name not in self.sources:
+            raise KeyError(f"Unknown dataset: {name}")
+
+        if name in self.resident:
+            self.counters['hits'] += 1
+            self.resident.move_to_end(name)
+        else:
+            self.counters['misses'] += 1
+            self._load(name)
+
+        entry = self.resident[name]
+        if self.active != name:
+            self.query_processor.set_entity_state(entry['entity_state'])
+            self.active = name
+        return entry['handler']
+
+    def _load(self, name, df=None):
+        """Load a dataset from the spill directory, its CSV or the given frame."""
+        start_time = time.time()
+        source = self.sources[name]
+        spill_path = source['spill_path']
+
+        if df is None and spill_path and os.path.isdir(spill_path):
+            handler = DataHandler(df=pd.read_pickle(os.path.join(spill_path, "frame.pkl")))
+            if source['shared_key']:
+                entity_state = self.shared_cache.load_or_build(source['shared_key'], lambda: self._learn(handler))
+            else:
+                entity_state = load_entity_state(spill_path)
+            self.counters['reloads'] += 1
+        elif source['shared_key']:
+            # Built by whichever worker gets there first, mapped read-only by all
+            handler = DataHandler(csv_path=source['csv_path'])
+            entity_state = self.shared_cache.load_or_build(source['shared_key'], lambda: self._learn(handler))
+            self.counters['loads'] += 1
+        else:
+            handler = DataHandler(csv_path=source['csv_path'], df=df)
+            entity_state = self._learn(handler)
+            self.counters['loads'] += 1
+
+        if EMBEDDING['compact_frame']:
+            handler.compact_columns(self.query_processor.entity_columns(handler.df).values())
+        # Built now so the budget covers them, rather than growing on the first range query
+        handler.build_sorted_indexes()
+        self.resident[name] = {
+            'handler': handler,
+            'entity_state': entity_state,
+            'bytes': self.measure(handler, entity_state)
+        }
+        # The processor now holds this dataset's entities
+        self.query_processor.set_entity_state(entity_state)
+        self.active = name
+        print(f"Dataset '{name}' loaded in {time.time() - start_time:.2f} seconds")
+        self._enforce_budget(keep=name)
+
+    def _learn(self, handler):
+        """Learn a dataset's entities with the shared processor and return its entity state."""
+        self.query_processor.set_entity_state(None)
+        self.query_processor.learn_from_data(handler.df)
+        return self.query_processor.get_entity_state()
+
+    def evict(self, name, spill=True):
+        """
+        Drop a dataset from memory, spilling it to disk so it can be reloaded.
+
+        Args:
+            name (str): Dataset name
+            spill (bool): Whether to write the dataset to the spill directory first
+        """
+        entry = self.resident.pop(name, None)
+        if entry is None:
+            return
+        if spill:
+            self.sources[name]['spill_path'] = self._spill(name, entry)
+        if self.active == name:
+            self.query_processor.set_entity_state(None)
+            self.active = None
+        self.counters['evictions'] += 1
+        print(f"Evicted dataset '{name}' ({entry['bytes'] / 1024 / 1024:.1f} MB)")
+
+    def _enforce_budget(self, keep=None):
+        """Evict the coldest datasets until resident memory fits the budget."""
+        while self.resident_bytes() > self.memory_budget and len(self.resident) > 1:
+            coldest = next(name for name in self.resident if name != keep)
+            self.evict(coldest)
+
+    def _spill(self, name, entry):
+        """Write a dataset's frame and entity state to the spill directory."""
+        spill_path = os.path.join(self.spill_dir, _safe_name(name))
+        if os.path.isdir(spill_path):
+            shutil.rmtree(spill_path)
+        os.makedirs(spill_path)
+
+        entry['handler'].df.to_pickle(os.path.join(spill_path, "frame.pkl"))
+        if not self.sources[name]['shared_key']:
+            # Shared entity state stays published and is mapped again on reload
+            save_entity_state(entry['entity_state'], spill_path)
+        return spill_path
+
+    @staticmethod
+    def measure(handler, entity_state):
+        """
+        Estimate the memory held by a dataset.
+
+        Args:
+            handler (DataHandler): Handler holding the frame, sorted indexes and statistics
+            entity_state (dict): Entity state from QueryProcessor
+
+        Returns:
+            int: Approximate size in bytes
+        """
+        total = handler.nbytes
+        # Mapped stores live in the page cache, shared with the other workers
+        total += sum(store.nbytes for store in entity_state['stores'].values() if not store.mapped)
+        return total
+
+    def resident_bytes(self):
+        """Total memory held by resident datasets in bytes."""
+        return sum(entry['bytes'] for entry in self.resident.values())
+
+    def stats(self):
+        """
+        Report residency and eviction statistics.
+
+        Returns:
+            dict: Resident datasets, memory usage and counters
+        """
+        return {
+            'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+            'resident_mb': round(self.resident_bytes() / 1024 / 1024, 1),
+            'resident': {name: round(entry['bytes'] / 1024 / 1024, 1) for name, entry in self.resident.items()},
+            'spilled': [name for name in self.sources if name not in self.resident],
+            'active': self.active,
+            'shared': self.shared_cache.stats() if self.shared_cache is not None else None,
+            **self.counters
+        }
+
+
+def _safe_name(name):
+    """Turn a dataset name (often a path) into a directory name."""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
@@ -0,0 +1,213 @@
+import bisect
+import json
+import os
+import sys
+
+import numpy as np
+
+# Rows scored per block, so quantized embeddings are never expanded to float32 all at once
+SCORE_BLOCK = 8192
+
+
+class EntityStore:
+    def __init__(self, names, embeddings=None, dtype="float16"):
+        """
+        Hold an entity vocabulary in one UTF-8 buffer with offsets, plus compact embeddings.
+
+        Names are kept sorted, which matches the category order pandas uses for a
+        string column converted with astype('category'), so store ids equal the
+        frame's category codes. The categorical still keeps its own copy of each
+        name: pandas categories are Python strings and cannot be a view over this
+        buffer, so a compacted column holds its names twice in total, once in its
+        dictionary and once here, instead of once per row.
+
+        Args:
+            names (iterable): Entity names
+            embeddings (ndarray, optional): One float32 embedding row per name
+            dtype (str): "float32", "float16" or "int8" (per-row scaled) embedding storage
+        """
+        names = [str(name) for name in names]
+        order = sorted(range(len(names)), key=names.__getitem__)
+        if order != list(range(len(names))):
+            names = [names[i] for i in order]
+            if embeddings is not None:
+                embeddings = np.asarray(embeddings)[order]
+
+        encoded = [name.encode('utf-8') for name in names]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        self.dtype = dtype
+        self.embeddings = None
+        self.scales = None
+        if embeddings is not None:
+            self._quantize(np.asarray(embeddings, dtype=np.float32))
+
+    def _quantize(self, embeddings):
+        if self.dtype == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self.embeddings = np.round(embeddings / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        else:
+            self.embeddings = embeddings.astype(self.dtype)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("EntityStore index out of range")
+        return self.buffer[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __contains__(self, name):
+        return self.index(name) is not None
+
+    def index(self, name):
+        """
+        Find the id of a name by binary search over the sorted buffer.
+
+        Args:
+            name (str): Entity name
+
+        Returns:
+            int or None: Id of the name, or None if it is not in the store
+        """
+        i = bisect.bisect_left(self, name)
+        return i if i < len(self) and self[i] == name else None
+
+    def top_candidates(self, query_embedding, k):
+        """
+        Approximate nearest names by dot product against the compact embeddings.
+
+        Args:
+            query_embedding (ndarray): Embedding of the query
+            k (int): Number of candidates to return
+
+        Returns:
+            list: Up to k names, best first, for exact rescoring by the caller
+        """
+        if self.embeddings is None or len(self) == 0:
+            return list(self)[:k]
+
+        query_embedding = np.asarray(query_embedding, dtype=np.float32).ravel()
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK):
+            block = self.embeddings[start:start + SCORE_BLOCK].astype(np.float32)
+            scores[start:start + SCORE_BLOCK] = block @ query_embedding
+        if self.scales is not None:
+            scores *= self.scales
+
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self[i] for i in top]
+
+    @property
+    def nbytes(self):
+        """Memory held by the store in bytes."""
+        total = self.buffer.nbytes + self.offsets.nbytes
+        if self.embeddings is not None:
+            total += self.embeddings.nbytes
+        if self.scales is not None:
+            total += self.scales.nbytes
+        return total
+
+    def list_nbytes(self):
+        """Memory the same names and embeddings take as a list of str and float32 rows."""
+        total = sys.getsizeof([None] * len(self)) + sum(sys.getsizeof(name) for name in self)
+        if self.embeddings is not None:
+            total += self.embeddings.size * 4
+        return total
+
+    def save(self, path):
+        """
+        Write the store to a directory of .npy files.
+
+        Args:
+            path (str): Directory to write to
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "buffer.npy"), self.buffer)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        if self.embeddings is not None:
+            np.save(os.path.join(path, "embeddings.npy"), self.embeddings)
+        if self.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), self.scales)
+        with open(os.path.join(path, "store.json"), "w") as f:
+            json.dump({'dtype': self.dtype, 'size': len(self)}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Read a store written by save.
+
+        Args:
+            path (str): Directory written by save
+            mmap_mode (str, optional): Passed to np.load, e.g. "r" to map the arrays read-only
+
+        Returns:
+            EntityStore: The loaded store
+        """
+        with open(os.path.join(path, "store.json")) as f:
+            meta = json.load(f)
+
+        store = cls.__new__(cls)
+        store.dtype = meta['dtype']
+        store.buffer = np.load(os.path.join(path, "buffer.npy"), mmap_mode=mmap_mode)
+        store.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode)
+        store.embeddings = None
+        store.scales = None
+        if os.path.exists(os.path.join(path, "embeddings.npy")):
+            store.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode=mmap_mode)
+        if os.path.exists(os.path.join(path, "scales.npy")):
+            store.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode=mmap_mode)
+        return store
+
+    @property
+    def mapped(self):
+        """Whether the arrays are memory-mapped files, shared with other processes through the page cache."""
+        return isinstance(self.buffer, np.memmap)
+
+
+def save_entity_state(state, path):
+    """
+    Write entity state from QueryProcessor.get_entity_state to a directory.
+
+    Args:
+        state (dict): Entity stores and years
+        path (str): Directory to write to
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, "years.json"), "w") as f:
+        json.dump([int(y) for y in state['years']], f)
+    for entity_type, store in state['stores'].items():
+        store.save(os.path.join(path, entity_type))
+
+
+def load_entity_state(path, mmap_mode=None):
+    """
+    Read entity state written by save_entity_state.
+
+    Args:
+        path (str): Directory written by save_entity_state
+        mmap_mode (str, optional): "r" to map the store arrays read-only instead of reading them
+
+    Returns:
+        dict: Entity state for QueryProcessor.set_entity_state
+    """
+    with open(os.path.join(path, "years.json")) as f:
+        state = {'years': json.load(f), 'stores': {}}
+    for entity_type in os.listdir(path):
+        if os.path.isdir(os.path.join(path, entity_type)):
+            state['stores'][entity_type] = EntityStore.load(os.path.join(path, entity_type), mmap_mode=mmap_mode)
+    return state
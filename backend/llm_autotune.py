@@ -0,0 +1,99 @@
+"""
+Benchmark thread counts and batch sizes for the configured LLM runtime on this
+machine and save the fastest combination to LLM['tuning_path'], where LocalLLM
+picks it up on the next start.
+
+    python -m backend.llm_autotune
+    python -m backend.llm_autotune --runtime llama_cpp --threads 8 16 32 --batch-sizes 32 128 512
+"""
+import argparse
+import json
+import os
+import time
+
+from .llm_utils import LocalLLM
+
+# Representative request: a prompt with a page of results and a short answer
+BENCHMARK_PROMPT = (
+    "You are an Olympic assistant. Based on the following data, clearly answer the user's question.\n"
+    + "Team Year Sport Event Medal\n" * 40
+    + "User Question: \"How many gold medals did USA win in 2008?\"\nAnswer:"
+)
+
+
+def default_thread_counts():
+    cpus = os.cpu_count() or 1
+    counts = {1, cpus // 2, cpus}
+    counts.update(2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus)
+    return sorted(c for c in counts if c >= 1)
+
+
+def autotune(llm, thread_counts, batch_sizes, n_generate=32, repeats=2):
+    """
+    Benchmark every thread count and batch size combination.
+
+    The best combination minimizes the estimated time of a request with the
+    benchmark prompt and n_generate generated tokens.
+
+    Args:
+        llm (LocalLLM): Loaded model
+        thread_counts (list): Thread counts to try
+        batch_sizes (list): Batch sizes to try
+        n_generate (int): Tokens generated per measurement
+        repeats (int): Measurements per combination, the best is kept
+
+    Returns:
+        dict: Best settings and all measurements
+    """
+    tokens = llm.backend.tokenize(BENCHMARK_PROMPT)
+    results = []
+    for threads in thread_counts:
+        for batch_size in batch_sizes:
+            runs = [llm.backend.benchmark(tokens, n_generate, threads, batch_size) for _ in range(repeats)]
+            prompt_tps = max(run[0] for run in runs)
+            generate_tps = max(run[1] for run in runs)
+            request_seconds = len(tokens) / prompt_tps + n_generate / generate_tps
+            results.append({
+                'threads': threads,
+                'batch_size': batch_size,
+                'prompt_tokens_per_s': round(prompt_tps, 1),
+                'generated_tokens_per_s': round(generate_tps, 2),
+                'request_seconds': round(request_seconds, 3)
+            })
+            print(f"threads={threads:>3} batch_size={batch_size:>4}  prompt {prompt_tps:8.1f} tok/s  "
+                  f"generate {generate_tps:6.2f} tok/s  request {request_seconds:.2f}s")
+
+    best = min(results, key=lambda r: r['request_seconds'])
+    return {
+        'runtime': llm.settings['runtime'],
+        'model_file': llm.settings['model_file'],
+        'cpu_count': os.cpu_count(),
+        'tuned_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'threads': best['threads'],
+        'batch_size': best['batch_size'],
+        'prompt_tokens': len(tokens),
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autotune LLM threads and batch size for this CPU")
+    parser.add_argument("--runtime", help="Runtime to tune, defaults to LLM['runtime']")
+    parser.add_argument("--threads", type=int, nargs="+", default=default_thread_counts())
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 32, 128, 512])
+    parser.add_argument("--generate", type=int, default=32, help="Tokens generated per measurement")
+    parser.add_argument("--output", help="Where to save the settings, defaults to LLM['tuning_path']")
+    args = parser.parse_args()
+
+    llm = LocalLLM(runtime=args.runtime)
+    tuning = autotune(llm, args.threads, args.batch_sizes, n_generate=args.generate)
+
+    output = args.output or llm.settings['tuning_path']
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(tuning, f, indent=2)
+    print(f"Best: threads={tuning['threads']} batch_size={tuning['batch_size']}, saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
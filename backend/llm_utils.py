@@ -1,26 +1,306 @@
 # modules/llm_utils.py
 
-from ctransformers import AutoModelForCausalLM
+import json
 import os
+import re
 import time
+import warnings
+import zlib
 from huggingface_hub import hf_hub_download
+from config import LLM
+
+
+class LLMBackend:
+    """
+    Interface for the inference runtimes LocalLLM can drive.
+
+    Backends are constructed with the model path and the merged runtime settings
+    (see LLM in config.py) and expose tokenization, prefix caching and generation.
+    """
+    name = None
+    needs_model_file = True
+
+    def __init__(self, model_path, settings):
+        self.model_path = model_path
+        self.settings = settings
+
+    def tokenize(self, text):
+        raise NotImplementedError
+
+    def count_tokens(self, text):
+        """Number of tokens in generated text."""
+        return len(self.tokenize(text)) if text else 0
+
+    def cached_prefix_length(self, tokens):
+        """Number of prompt tokens the next call will resume from the KV cache."""
+        return 0
+
+    def warm_prefix(self, prefix):
+        """Evaluate a prompt prefix so later prompts starting with it reuse its KV state."""
+
+    def generate(self, prompt, max_new_tokens=None, stop=None):
+        """
+        Generate at most max_new_tokens, ending before the first stop sequence.
+
+        Returns:
+            tuple: (text, finish reason, generated tokens); the finish reason is "length"
+                when the budget ran out and "stop" otherwise, either is None if the
+                runtime does not report it
+        """
+        raise NotImplementedError
+
+    def benchmark(self, tokens, n_generate, threads, batch_size):
+        """
+        Measure prompt evaluation and generation speed with the given settings.
+
+        Returns:
+            tuple: (prompt tokens/s, generated tokens/s)
+        """
+        raise NotImplementedError
+
+
+def _common_prefix_length(tokens, context):
+    # Runtimes always re-evaluate at least the last prompt token
+    n = min(len(tokens) - 1, len(context))
+    length = 0
+    while length < n and tokens[length] == context[length]:
+        length += 1
+    return length
+
+
+class CTransformersBackend(LLMBackend):
+    name = "ctransformers"
+
+    def __init__(self, model_path, settings):
+        super().__init__(model_path, settings)
+        from ctransformers import AutoModelForCausalLM
+        self.llm = AutoModelForCausalLM.from_pretrained(
+            model_path_or_repo_id=model_path,
+            model_type=settings["model_type"],
+            context_length=settings["context_length"],
+            max_new_tokens=settings["max_new_tokens"],
+            temperature=settings["temperature"],
+            threads=settings["threads"],
+            batch_size=settings["batch_size"],
+            mmap=settings["mmap"],
+            mlock=settings["mlock"]
+        )
+
+    def tokenize(self, text):
+        return self.llm.tokenize(text)
+
+    def count_tokens(self, text):
+        return len(self.llm.tokenize(text, add_bos_token=False)) if text else 0
+
+    def cached_prefix_length(self, tokens):
+        # ctransformers keeps the tokens of the last evaluated sequence and only
+        # evaluates the tokens after the longest common prefix on the next call
+        return _common_prefix_length(tokens, self.llm._context)
+
+    def warm_prefix(self, prefix):
+        tokens = self.llm.prepare_inputs_for_generation(self.llm.tokenize(prefix), reset=True)
+        self.llm.eval(tokens)
+
+    def generate(self, prompt, max_new_tokens=None, stop=None):
+        # ctransformers returns only the text; LocalLLM counts its tokens
+        return self.llm(prompt, max_new_tokens=max_new_tokens, stop=stop), None, None
+
+    def benchmark(self, tokens, n_generate, threads, batch_size):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.llm.reset()
+        start_time = time.time()
+        self.llm.eval(tokens, batch_size=batch_size, threads=threads)
+        prompt_time = time.time() - start_time
+
+        start_time = time.time()
+        for _ in range(n_generate):
+            token = self.llm.sample()
+            self.llm.eval([token], batch_size=batch_size, threads=threads)
+        generate_time = time.time() - start_time
+        return len(tokens) / prompt_time, n_generate / generate_time
+
+
+class LlamaCppBackend(LLMBackend):
+    name = "llama_cpp"
+
+    def __init__(self, model_path, settings):
+        super().__init__(model_path, settings)
+        from llama_cpp import Llama
+        self.llm = Llama(
+            model_path=model_path,
+            n_ctx=settings["context_length"],
+            n_threads=settings["threads"] if settings["threads"] > 0 else None,
+            n_batch=settings["batch_size"],
+            use_mmap=settings["mmap"],
+            use_mlock=settings["mlock"],
+            verbose=False
+        )
+        # Models loaded by benchmark, reused across thread counts and repeats
+        self.benchmark_models = {}
+
+    def tokenize(self, text):
+        return self.llm.tokenize(text.encode())
+
+    def count_tokens(self, text):
+        return len(self.llm.tokenize(text.encode(), add_bos=False)) if text else 0
+
+    def cached_prefix_length(self, tokens):
+        # llama.cpp also resumes after the longest prefix shared with its current state
+        return _common_prefix_length(tokens, self.llm.input_ids[:self.llm.n_tokens].tolist())
+
+    def warm_prefix(self, prefix):
+        self.llm.reset()
+        self.llm.eval(self.tokenize(prefix))
+
+    def generate(self, prompt, max_new_tokens=None, stop=None):
+        output = self.llm(
+            prompt,
+            max_tokens=max_new_tokens or self.settings["max_new_tokens"],
+            temperature=self.settings["temperature"],
+            stop=stop or []
+        )
+        choice = output["choices"][0]
+        return choice["text"], choice.get("finish_reason"), output.get("usage", {}).get("completion_tokens")
+
+    def _benchmark_model(self, threads, batch_size):
+        """
+        Return a model with the given threads and batch size, loading each batch size once.
+
+        llama.cpp fixes the batch size when the context is created, while threads can be
+        changed on a live context; older bindings without that get one model per combination.
+        """
+        import llama_cpp
+        set_threads = getattr(llama_cpp, "llama_set_n_threads", None)
+        key = batch_size if set_threads else (threads, batch_size)
+        if key not in self.benchmark_models:
+            settings = {**self.settings, "threads": threads, "batch_size": batch_size}
+            self.benchmark_models[key] = LlamaCppBackend(self.model_path, settings).llm
+        llm = self.benchmark_models[key]
+        if set_threads:
+            set_threads(llm.ctx, threads, threads)
+        return llm
+
+    def benchmark(self, tokens, n_generate, threads, batch_size):
+        llm = self._benchmark_model(threads, batch_size)
+        llm.reset()
+        start_time = time.time()
+        llm.eval(tokens)
+        prompt_time = time.time() - start_time
+
+        start_time = time.time()
+        for _ in range(n_generate):
+            llm.eval([llm.sample()])
+        generate_time = time.time() - start_time
+        return len(tokens) / prompt_time, n_generate / generate_time
+
+
+class StubBackend(LLMBackend):
+    """Deterministic runtime with configurable latency, for load tests and development."""
+    name = "stub"
+    needs_model_file = False
+
+    def __init__(self, model_path, settings):
+        super().__init__(model_path, settings)
+        self.latency = settings.get("stub_latency_ms", 0) / 1000
+        self.per_token = settings.get("stub_token_latency_ms", 0) / 1000
+        self.response_tokens = settings.get("stub_response_tokens", 20)
+        # Tokens of the last evaluated sequence, tracked like the real runtimes' KV cache
+        self.context = []
+
+    def tokenize(self, text):
+        return text.split()
+
+    def cached_prefix_length(self, tokens):
+        return _common_prefix_length(tokens, self.context)
+
+    def warm_prefix(self, prefix):
+        self.context = self.tokenize(prefix)
+
+    def generate(self, prompt, max_new_tokens=None, stop=None):
+        max_new_tokens = max_new_tokens or self.settings["max_new_tokens"]
+        n_tokens = min(self.response_tokens, max_new_tokens)
+        digest = zlib.crc32(prompt.encode())
+        text = " ".join(f"word{(digest + i) % 97}" for i in range(n_tokens))
+        finish_reason = "length" if self.response_tokens > max_new_tokens else "stop"
+        for sequence in stop or []:
+            if sequence in text:
+                text = text[:text.index(sequence)]
+                finish_reason = "stop"
+        self.context = self.tokenize(prompt) + self.tokenize(text)
+        generated = self.count_tokens(text)
+        time.sleep(self.latency + self.per_token * generated)
+        return text, finish_reason, generated
+
+    def benchmark(self, tokens, n_generate, threads, batch_size):
+        return len(tokens) / max(self.latency, 1e-6), 1 / max(self.per_token, 1e-6)
+
+
+BACKENDS = {backend.name: backend for backend in (CTransformersBackend, LlamaCppBackend, StubBackend)}
+
+
+def load_llm_settings(overrides=None):
+    """
+    Merge the LLM settings from config.py, any saved autotune results for the
+    runtime, and explicit overrides (highest priority).
+
+    Args:
+        overrides (dict, optional): Settings that take precedence
+
+    Returns:
+        dict: Runtime settings
+    """
+    settings = {**LLM, **(overrides or {})}
+    tuning_path = settings.get("tuning_path")
+    if tuning_path and os.path.isfile(tuning_path):
+        with open(tuning_path) as f:
+            tuned = json.load(f)
+        if tuned.get("runtime") == settings["runtime"] and tuned.get("model_file") == settings["model_file"]:
+            for key in ("threads", "batch_size"):
+                if key not in (overrides or {}):
+                    settings[key] = tuned[key]
+    return settings
+
+
+def trim_to_sentence(text):
+    """Cut text after its last complete sentence or line, if it has one."""
+    for end in reversed(list(re.finditer(r"[.!?](?=\s|$)|\n", text))):
+        # "3." opening a list item does not end a sentence
+        line_start = text.rfind("\n", 0, end.start()) + 1
+        if not text[line_start:end.start()].strip().isdigit():
+            return text[:end.end()]
+    return text
+
 
 class LocalLLM:
-    def __init__(self, model_folder="models", model_file="mistral-7b-instruct-v0.2.Q4_K_M.gguf"):
+    def __init__(self, model_folder=None, model_file=None, prompt_prefix=None, runtime=None, settings=None):
         """
-        Initialize a local LLM (e.g., Mistral) using ctransformers and GGUF format.
-        
+        Initialize a local LLM (e.g., Mistral) in GGUF format on a pluggable runtime.
+
         Args:
-            model_folder (str): Folder containing the GGUF model
-            model_file (str): Name of the GGUF file
+            model_folder (str, optional): Folder containing the GGUF model
+            model_file (str, optional): Name of the GGUF file
+            prompt_prefix (str, optional): Fixed start of every prompt, evaluated once at load
+                so its KV state is reused by later calls
+            runtime (str, optional): "ctransformers", "llama_cpp" or "stub", defaults to LLM['runtime']
+            settings (dict, optional): Overrides for the runtime settings in config.LLM
         """
         start_time = time.time()
+        overrides = dict(settings or {})
+        for key, value in (("model_folder", model_folder), ("model_file", model_file), ("runtime", runtime)):
+            if value is not None:
+                overrides[key] = value
+        self.settings = load_llm_settings(overrides)
+        backend_cls = BACKENDS[self.settings["runtime"]]
+        model_folder = self.settings["model_folder"]
+        model_file = self.settings["model_file"]
+
         # Build the full path to the model file
-        os.makedirs(model_folder, exist_ok=True)
         self.model_path = os.path.join(model_folder, model_file)
 
         # Download the model if it doesn't exist locally
-        if not os.path.isfile(self.model_path):
+        if backend_cls.needs_model_file and not os.path.isfile(self.model_path):
+            os.makedirs(model_folder, exist_ok=True)
             print(f"Downloading model to {self.model_path}...")
             download_start = time.time()
             try:
@@ -34,36 +314,74 @@ class LocalLLM:
             except Exception as e:
                 raise RuntimeError(f"Failed to download model: {str(e)}")
 
-        if not os.path.isfile(self.model_path):
-            raise FileNotFoundError(f"Model file not found at {self.model_path}")
+            if not os.path.isfile(self.model_path):
+                raise FileNotFoundError(f"Model file not found at {self.model_path}")
 
         # Load the local model
-        print("Loading the model...")
+        print(f"Loading the model with {backend_cls.name} "
+              f"(threads={self.settings['threads']}, batch_size={self.settings['batch_size']})...")
         load_start = time.time()
-        self.llm = AutoModelForCausalLM.from_pretrained(
-            model_path_or_repo_id=self.model_path,
-            model_type="mistral",
-            context_length=2048,
-            max_new_tokens=256,
-            temperature=0.7
-        )
+        self.backend = backend_cls(self.model_path, self.settings)
         print(f"Model loaded in {time.time() - load_start:.2f} seconds")
+
+        # Prompt tokens evaluated vs. resumed from the KV cache, cumulative and for the last call
+        self.prefix_stats = {'calls': 0, 'prompt_tokens': 0, 'reused_tokens': 0}
+        self.last_stats = {}
+        if prompt_prefix:
+            self.warm_prefix(prompt_prefix)
         print(f"Total initialization time: {time.time() - start_time:.2f} seconds")
 
-    def generate_response(self, prompt):
+    def warm_prefix(self, prefix):
+        """
+        Evaluate a prompt prefix so its KV state is already cached.
+
+        The runtimes keep the tokens of the last evaluated sequence and, on the next
+        call, only evaluate the tokens after the longest common prefix. Warming the
+        fixed system prefix means the first request resumes from it too.
+
+        Args:
+            prefix (str): Stable start shared by the prompts
+        """
+        start_time = time.time()
+        self.backend.warm_prefix(prefix)
+        print(f"Prompt prefix evaluated in {time.time() - start_time:.2f} seconds")
+
+    def generate_response(self, prompt, max_new_tokens=None, stop=None):
         """
         Generate a natural language response from the LLM.
-        
+
         Args:
             prompt (str): Prompt to send to the LLM
-            
+            max_new_tokens (int, optional): Token budget, defaults to LLM['max_new_tokens']
+            stop (list, optional): Sequences that end the response; they are not included
+
         Returns:
             str: Generated response
         """
         try:
             start_time = time.time()
-            response = self.llm(prompt)
+            max_new_tokens = max_new_tokens or self.settings["max_new_tokens"]
+            tokens = self.backend.tokenize(prompt)
+            reused = self.backend.cached_prefix_length(tokens)
+            self.last_stats = {'prompt_tokens': len(tokens), 'reused_tokens': reused}
+            self.prefix_stats['calls'] += 1
+            self.prefix_stats['prompt_tokens'] += len(tokens)
+            self.prefix_stats['reused_tokens'] += reused
+
+            response, stop_reason, generated = self.backend.generate(prompt, max_new_tokens=max_new_tokens, stop=stop)
+            if generated is None:
+                generated = self.backend.count_tokens(response)
+            if stop_reason is None:
+                # Runtimes that do not report why they stopped ran out of budget if they used it all
+                stop_reason = "length" if generated >= max_new_tokens else "stop"
+            if stop_reason == "length":
+                # Out of budget: drop the unfinished last sentence
+                response = trim_to_sentence(response)
+            self.last_stats.update({'generated_tokens': generated, 'max_new_tokens': max_new_tokens,
+                                    'stop_reason': stop_reason})
+            print(f"Reused {reused} of {len(tokens)} prompt tokens from the KV cache")
+            print(f"Generated {generated} of {max_new_tokens} budgeted tokens (stopped by {stop_reason})")
             print(f"Response generation time: {time.time() - start_time:.2f} seconds")
             return response.strip()
         except Exception as e:
-            return f"[Error] Failed to generate response: {str(e)}"
\ No newline at end of file
+            return f"[Error] Failed to generate response: {str(e)}"
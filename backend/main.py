@@ -1,11 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
-import pandas as pd
-from query_processor import QueryProcessor
-from data_handler import DataHandler
-from response_generator import ResponseGenerator
+from typing import Dict, Any, List, Optional
+from config import LOAD_TEST, SEARCH, SHARED_ENTITIES, WARM_SET
+from backend.query_processor import QueryProcessor
+from backend.data_handler import DataHandler
+from backend.response_generator import ResponseGenerator
+from backend.dataset_registry import DatasetRegistry
+from backend.search_engine import missing_export_dependency, stream_results
+from backend.slow_query_log import SlowQueryLog
+from backend.session_store import SessionStore
+from backend.shared_entities import SharedEntityCache
+from backend.warm_set import QueryLog, WarmSet, llm_id, start_rebuild
+from backend.stub_models import StubEmbeddingModel
+from backend.llm_utils import LocalLLM
+import os
 import time
 
 app = FastAPI(title="Voice-Enabled Olympic Data Assistant")
@@ -23,53 +33,178 @@ app.add_middleware(
 data_handler = None
 query_processor = None
 response_generator = None
+dataset_registry = None
+slow_query_log = SlowQueryLog()
+sessions = SessionStore()
+query_log = QueryLog()
+warm_set = None
+warm_rebuilds = {}          # dataset version -> time this worker last started the warm set job
+rebuild_processes = []      # Warm set jobs started by this worker, reaped once they exit
+ready = False
 
 class QueryRequest(BaseModel):
     query: str
     data_path: Optional[str] = None
+    session_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     response: str
     processing_time: float
     entities: Dict[str, Any]
     intent: str
+    follow_up: bool = False
+    warm_hit: bool = False
+    generated_tokens: Optional[int] = None
+    max_new_tokens: Optional[int] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    data_path: Optional[str] = None
+    page_size: Optional[int] = None
+    offset: int = 0
+    cursor: Optional[int] = None
+    explain: bool = False
+    session_id: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    result_count: int
+    data: List[Dict[str, Any]]
+    columns: List[str]
+    next_offset: Optional[int]
+    next_cursor: Optional[int]
+    intent: str
+    follow_up: bool = False
+    plan: Optional[Dict[str, Any]] = None
+
+class ExportRequest(BaseModel):
+    query: str
+    data_path: Optional[str] = None
+    format: str = "ndjson"
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+def use_dataset(data_path):
+    """Make the dataset at data_path current, registering it on first use."""
+    global data_handler
+    if data_path:
+        if data_path not in dataset_registry.sources:
+            dataset_registry.register(data_path, csv_path=data_path)
+        data_handler = dataset_registry.activate(data_path)
+    refresh_warm_set()
+
+def active_version():
+    """Version of the active dataset's CSV, None for frames without one."""
+    if dataset_registry.active is None:
+        return None
+    return dataset_registry.sources[dataset_registry.active]['version']
+
+def refresh_warm_set():
+    """Serve the active dataset's warm set, starting the job that builds it if there is none."""
+    if warm_set is None:
+        return
+    # Reap finished jobs so they do not linger as zombies
+    rebuild_processes[:] = [process for process in rebuild_processes if process.poll() is None]
+    version = active_version()
+    exists = warm_set.refresh(version)
+    if not version or not WARM_SET["rebuild_on_load"]:
+        return
+    interval = WARM_SET["rebuild_interval_seconds"]
+    stale = not exists or time.time() - warm_set.mtime > interval
+    if stale and time.time() - warm_rebuilds.get(version, 0) > interval:
+        warm_rebuilds[version] = time.time()
+        rebuild_processes.append(start_rebuild(dataset_registry.sources[dataset_registry.active]['csv_path']))
 
 @app.on_event("startup")
 async def startup_event():
-    global data_handler, query_processor, response_generator
+    global data_handler, query_processor, response_generator, dataset_registry, warm_set, ready
     start_time = time.time()
     
-    # Initialize components
+    # Initialize components, with deterministic stub models for load testing
     data_handler = DataHandler()
-    query_processor = QueryProcessor()
-    response_generator = ResponseGenerator()
+    if os.environ.get("STAT_AGENT_STUB_MODELS"):
+        query_processor = QueryProcessor(model=StubEmbeddingModel(
+            latency_ms=float(os.environ.get("STAT_AGENT_STUB_EMBED_MS", LOAD_TEST["stub_embed_latency_ms"]))
+        ))
+        response_generator = ResponseGenerator(llm=LocalLLM(runtime="stub", settings={
+            "stub_latency_ms": float(os.environ.get("STAT_AGENT_STUB_LLM_MS", LOAD_TEST["stub_llm_latency_ms"])),
+            "stub_token_latency_ms": float(os.environ.get("STAT_AGENT_STUB_TOKEN_MS", LOAD_TEST["stub_token_latency_ms"]))
+        }))
+    else:
+        query_processor = QueryProcessor()
+        response_generator = ResponseGenerator()
+    shared_cache = SharedEntityCache() if SHARED_ENTITIES["enabled"] else None
+    dataset_registry = DatasetRegistry(query_processor, shared_cache=shared_cache)
+    if WARM_SET["enabled"]:
+        warm_set = WarmSet(llm=llm_id(response_generator.llm.settings))
+
+    # Attach the preloaded dataset's shared entity state and warm set before reporting ready
+    preload_path = os.environ.get("STAT_AGENT_DATA_PATH", SHARED_ENTITIES["preload_data_path"])
+    if preload_path:
+        use_dataset(preload_path)
+    ready = True
     
     print(f"Application startup completed in {time.time() - start_time:.2f} seconds")
 
 @app.post("/query", response_model=QueryResponse)
-async def process_query(request: QueryRequest):
+async def process_query(request: QueryRequest, http_request: Request):
     start_time = time.time()
     
     try:
-        # Load data if provided
-        if request.data_path:
-            df = pd.read_csv(request.data_path)
-            data_handler.df = df
-            query_processor.learn_from_data(df)
-        
-        # Process query
-        query_params = query_processor.process_query(request.query)
-        
-        # Get results
-        results, info = data_handler.search_data(query_params)
-        
-        # Generate response
-        response = response_generator.generate_response(
-            request.query,
-            results,
-            query_params['entities'],
-            query_params['intent']
-        )
+        with slow_query_log.track(request.query, headers=http_request.headers) as log_entry:
+            timer = log_entry['timer']
+
+            # Load data if provided, reusing it if it is already registered
+            with timer.stage('load_data'):
+                use_dataset(request.data_path)
+
+            # Process query
+            with timer.stage('process_query'):
+                query_params = query_processor.process_query(request.query)
+            timer.add(query_params['timings'])
+            log_entry['query_params'] = {k: v for k, v in query_params.items() if k != 'timings'}
+
+            # Get results, narrowing the session's previous results for follow-ups
+            refresh_warm_set()
+            with timer.stage('search_data'):
+                if request.session_id:
+                    query_params = sessions.resolve(
+                        request.session_id, query_params, query_processor.is_follow_up(request.query),
+                        dataset=request.data_path
+                    )
+                # Frequent searches are answered from the warm set
+                warm = warm_set.lookup(query_params) if warm_set is not None else None
+                if warm is None:
+                    results, info = data_handler.search_data(query_params)
+                    row_ids = data_handler.row_positions(results)
+                else:
+                    row_ids = warm['row_ids']
+                if request.session_id:
+                    sessions.save(request.session_id, query_params, row_ids, dataset=request.data_path)
+            log_entry['result_rows'] = len(row_ids)
+            log_entry['warm_hit'] = warm is not None
+
+            # Generate response
+            if warm is None:
+                with timer.stage('generate_response'):
+                    response = response_generator.generate_response(
+                        request.query,
+                        results,
+                        query_params['entities'],
+                        query_params['intent']
+                    )
+                generation_stats = dict(response_generator.last_stats)
+                log_entry['prompt_tokens'] = generation_stats.pop('prompt_tokens', None)
+                log_entry['reused_tokens'] = generation_stats.pop('reused_tokens', None)
+                log_entry['generated_tokens'] = generation_stats.pop('generated_tokens', None)
+                log_entry['max_new_tokens'] = generation_stats.pop('max_new_tokens', None)
+                timer.add(generation_stats)
+            else:
+                response = warm['response']
+            if WARM_SET["enabled"]:
+                query_log.append(request.query, query_params, dataset=active_version())
         
         processing_time = time.time() - start_time
         
@@ -77,12 +212,86 @@ async def process_query(request: QueryRequest):
             response=response,
             processing_time=processing_time,
             entities=query_params['entities'],
-            intent=query_params['intent']
+            intent=query_params['intent'],
+            follow_up=query_params.get('follow_up', False),
+            warm_hit=warm is not None,
+            generated_tokens=log_entry.get('generated_tokens'),
+            max_new_tokens=log_entry.get('max_new_tokens')
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search", response_model=SearchResponse)
+async def search(request: SearchRequest):
+    try:
+        use_dataset(request.data_path)
+        query_params = query_processor.process_query(request.query)
+        query_params['explain'] = request.explain
+        query_params, page, info = sessions.search_page(
+            request.session_id, query_params, data_handler,
+            query_processor.is_follow_up(request.query), dataset=request.data_path,
+            page_size=request.page_size, offset=request.offset, cursor=request.cursor
+        )
+
+        return SearchResponse(
+            result_count=page['total'],
+            data=page['rows'].to_dict('records'),
+            columns=page['columns'],
+            next_offset=page['next_offset'],
+            next_cursor=page['next_cursor'],
+            intent=query_params['intent'],
+            follow_up=query_params.get('follow_up', False),
+            plan=info.get('plan')
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/export")
+async def export(request: ExportRequest):
+    if request.format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {request.format}")
+    # Fail before the response starts, not partway through a 200 stream
+    missing = missing_export_dependency(request.format)
+    if missing:
+        raise HTTPException(status_code=501, detail=f"{request.format} export requires {missing} to be installed")
+
+    use_dataset(request.data_path)
+    query_params = query_processor.process_query(request.query)
+    chunks = data_handler.iter_search_data(query_params, chunksize=SEARCH['export_chunksize'])
+    return StreamingResponse(stream_results(chunks, fmt=request.format), media_type=EXPORT_MEDIA_TYPES[request.format])
+
+@app.get("/datasets")
+async def dataset_stats():
+    return dataset_registry.stats()
+
+@app.get("/sessions")
+async def session_stats():
+    return sessions.stats()
+
+@app.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not sessions.end(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return {"ended": session_id}
+
+@app.get("/warm-set")
+async def warm_set_stats():
+    if warm_set is None:
+        raise HTTPException(status_code=404, detail="Warm set is disabled")
+    return warm_set.stats()
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    if not ready:
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {
+        "status": "ready",
+        "active_dataset": dataset_registry.active,
+        "shared": dataset_registry.shared_cache.stats() if dataset_registry.shared_cache is not None else None
+    } 
\ No newline at end of file
@@ -4,21 +4,70 @@ import time
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from fuzzywuzzy import fuzz, process
-from sentence_transformers import SentenceTransformer
 import numpy as np
+import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
+from config import EMBEDDING
+from .entity_store import EntityStore
+from .vocab_encoder import encode_vocabularies, load_embedding_model
 
 # Ensure required NLTK data is downloaded
 nltk.download('punkt')
 nltk.download('stopwords')
 
+# Comparison phrases for numeric range predicates, mapped to operators
+COMPARATORS = {
+    'more than': '>', 'greater than': '>', 'over': '>', 'above': '>', 'at least': '>=',
+    'less than': '<', 'fewer than': '<', 'under': '<', 'below': '<', 'at most': '<='
+}
+COMPARATOR_RE = '|'.join(sorted(COMPARATORS, key=len, reverse=True))
+YEAR_RE = r'((?:18|19|20)\d{2})'
+NUMBER_RE = r'(\d+(?:\.\d+)?)'
+
+# (pattern, numeric field, operators for the captured numbers); the first match wins for its span
+RANGE_PATTERNS = [
+    (rf'\bbetween {YEAR_RE} and {YEAR_RE}\b', 'year', ('>=', '<=')),
+    (rf'\bfrom {YEAR_RE} (?:to|until|through) {YEAR_RE}\b', 'year', ('>=', '<=')),
+    (rf'\b{YEAR_RE} ?(?:-|to) ?{YEAR_RE}\b', 'year', ('>=', '<=')),
+    (rf'\b(?:since|from|starting) {YEAR_RE}\b', 'year', ('>=',)),
+    (rf'\bafter {YEAR_RE}\b', 'year', ('>',)),
+    (rf'\bbefore {YEAR_RE}\b', 'year', ('<',)),
+    (rf'\b(?:until|up to|through) {YEAR_RE}\b', 'year', ('<=',)),
+    (rf'\btaller than {NUMBER_RE}', 'height', ('>',)),
+    (rf'\bshorter than {NUMBER_RE}', 'height', ('<',)),
+    (rf'\bheavier than {NUMBER_RE}', 'weight', ('>',)),
+    (rf'\blighter than {NUMBER_RE}', 'weight', ('<',)),
+    (rf'\bolder than {NUMBER_RE}', 'age', ('>',)),
+    (rf'\byounger than {NUMBER_RE}', 'age', ('<',)),
+    (rf'\baged? (?:between )?{NUMBER_RE} ?(?:-|to|and) ?{NUMBER_RE}\b', 'age', ('>=', '<=')),
+]
+# "<comparator> N kg/cm" and "<field> <comparator> N", e.g. "over 100 kg", "height under 170"
+AGE_CONTEXT_RE = re.compile(r'\b(?:athletes?|players?|competitors?|swimmers?|runners?|gymnasts?|aged?|years? old)\b')
+# A bare bound is only an age when the sentence or clause ends after the number, e.g.
+# "athletes under 20 in 2008" but not "athletes over 2 meters" or "over 30 gold medals"
+BARE_AGE_RE = re.compile(
+    r'\b(under|over|below|above) (\d{1,2})(?: years? old)?'
+    r'(?=\s*(?:$|[.,;:!?)]|(?:and|or|but|in|at|for|from|since|during|who|that|which)\b))'
+)
+AGE_BOUNDS = (10, 80)  # Plausible ages of competitors
+UNIT_FIELDS = {'kg': 'weight', 'cm': 'height'}
+FIELD_NAMES = {'year': 'year', 'age': 'age', 'height': 'height', 'weight': 'weight'}
+
+# References back to the previous question, e.g. "only swimming", "just gold", "of those";
+# openers like "now" or "also" start new questions as often as they continue old ones
+FOLLOW_UP_RE = re.compile(
+    r'^(?:only|just|what about|how about|same for)\b'
+    r'|\b(?:of|among|from) (?:those|them|these)\b'
+)
+
 class QueryProcessor:
-    def __init__(self, data_schema=None):
+    def __init__(self, data_schema=None, model=None):
         """
         Initialize the QueryProcessor with dataset schema information.
         
         Args:
             data_schema (dict, optional): Dictionary containing column names and types
+            model (optional): Embedding model to use instead of loading EMBEDDING['model_name']
         """
         self.data_schema = data_schema
         self.stopwords = set(stopwords.words('english'))
@@ -26,7 +75,9 @@ class QueryProcessor:
         # Time model loading
         start_time = time.time()
         print("Loading the model...")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')  # Lightweight embedding model
+        self.model = model or load_embedding_model()
+        # Pool processes encoding cold vocabularies load the same configured model themselves
+        self.model_loader = None if model else load_embedding_model
         end_time = time.time()
         print(f"Model loaded in {end_time - start_time:.2f} seconds")
 
@@ -47,8 +98,9 @@ class QueryProcessor:
         self.countries = []
         self.cities = []
         self.years = []
+        self.athletes = []
         self.all_entities = {}
-        self.kb_embeddings = {}
+        self.entity_stores = {}
 
     def learn_from_data(self, df):
         """
@@ -64,31 +116,111 @@ class QueryProcessor:
         self.df = df
 
         # Extract unique values for key columns
-        if 'Team' in df.columns:
-            self.countries = df['Team'].dropna().unique().tolist()
-        elif 'Country' in df.columns:
-            self.countries = df['Country'].dropna().unique().tolist()
-        self.all_entities['country'] = self.countries
-        self.kb_embeddings['country'] = self.model.encode(self.countries, convert_to_tensor=True) if self.countries else []
-
-        if 'City' in df.columns:
-            self.cities = df['City'].dropna().unique().tolist()
-            self.all_entities['city'] = self.cities
-            self.kb_embeddings['city'] = self.model.encode(self.cities, convert_to_tensor=True) if self.cities else []
+        self.entity_stores = {'country': EntityStore([])}
+        self.years = []
+        columns = self.entity_columns(df)
+        vocabularies = {entity_type: self._entity_names(df, col) for entity_type, col in columns.items()}
+        embeddings, _ = encode_vocabularies(vocabularies, self.model, model_loader=self.model_loader)
+        for entity_type, col in columns.items():
+            self.entity_stores[entity_type] = self._build_store(col, vocabularies[entity_type], embeddings[entity_type])
 
         year_cols = [col for col in df.columns if 'year' in col.lower()]
         if year_cols:
             self.years = df[year_cols[0]].dropna().astype(int).unique().tolist()
-            self.all_entities['year'] = [str(y) for y in self.years]
 
+        self.set_entity_state(self.get_entity_state())
+
+    @staticmethod
+    def entity_columns(df):
+        """
+        Find the columns holding each entity type.
+
+        Args:
+            df (DataFrame): The dataset
+
+        Returns:
+            dict: Entity type ('country', 'city', 'athlete') to column name
+        """
+        columns = {}
+        country_col = 'Team' if 'Team' in df.columns else ('Country' if 'Country' in df.columns else None)
+        if country_col:
+            columns['country'] = country_col
+        if 'City' in df.columns:
+            columns['city'] = 'City'
         name_col = 'Name' if 'Name' in df.columns else 'Athlete'
         if name_col in df.columns:
-            self.athletes = df[name_col].dropna().unique().tolist()
-            self.all_entities['athlete'] = self.athletes
-            self.kb_embeddings['athlete'] = self.model.encode(self.athletes, convert_to_tensor=True) if self.athletes else []
+            columns['athlete'] = name_col
+        return columns
+
+    def _entity_names(self, df, col):
+        """
+        Return the distinct names in an entity column, without modifying the frame.
+
+        Store ids follow sorted name order, the category order DataHandler.compact_columns
+        gives the column, so ids match the codes of a compacted frame.
+
+        Args:
+            df (DataFrame): The dataset to learn from
+            col (str): Column holding the entity names
+
+        Returns:
+            list: Distinct names
+        """
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return [str(name) for name in values.cat.categories]
+        return [str(name) for name in values.dropna().unique()]
+
+    def _build_store(self, col, names, embeddings):
+        """
+        Build a compact entity store for a column.
+
+        Args:
+            col (str): Column holding the entity names
+            names (list): Distinct names in the column
+            embeddings (ndarray or None): One embedding row per name
+
+        Returns:
+            EntityStore: Names and quantized embeddings for the column
+        """
+        start_time = time.time()
+        store = EntityStore(names, embeddings, dtype=EMBEDDING['dtype'])
+        print(f"Entity store for '{col}' built in {time.time() - start_time:.2f} seconds: "
+              f"{store.list_nbytes() / 2**20:.1f} MB as str list + float32 -> {store.nbytes / 2**20:.1f} MB compact")
+        return store
+
+    def get_entity_state(self):
+        """
+        Return the entity stores and years learned from the current dataset.
 
-        # Medal type knowledge base
-        self.all_entities['medal_type'] = ['gold', 'silver', 'bronze', 'total']
+        Returns:
+            dict: Entity state that can be restored with set_entity_state
+        """
+        return {
+            'stores': dict(self.entity_stores),
+            'years': self.years
+        }
+
+    def set_entity_state(self, state=None):
+        """
+        Swap in entity state previously returned by get_entity_state.
+
+        Args:
+            state (dict, optional): Entity state to restore; clears all entities if None
+        """
+        state = state or {}
+        self.entity_stores = dict(state.get('stores', {}))
+        self.years = state.get('years', [])
+        self.countries = self.entity_stores.get('country', [])
+        self.cities = self.entity_stores.get('city', [])
+        self.athletes = self.entity_stores.get('athlete', [])
+
+        self.all_entities = dict(self.entity_stores)
+        if self.years:
+            self.all_entities['year'] = [str(y) for y in self.years]
+        if self.entity_stores:
+            # Medal type knowledge base
+            self.all_entities['medal_type'] = ['gold', 'silver', 'bronze', 'total']
 
     def preprocess_query(self, query):
         """
@@ -112,7 +244,7 @@ class QueryProcessor:
 
         Args:
             query (str): The user's query
-            candidates (list): List of possible options (e.g., countries, cities)
+            candidates (list or EntityStore): Possible options (e.g., countries, cities)
             threshold (float): Minimum similarity score to consider a match
 
         Returns:
@@ -123,6 +255,9 @@ class QueryProcessor:
 
         start_time = time.time()
         q_emb = self.model.encode([query], convert_to_tensor=False)
+        if isinstance(candidates, EntityStore):
+            # Shortlist with the compact embeddings, then rescore the shortlist exactly
+            candidates = candidates.top_candidates(q_emb[0], EMBEDDING['rescore_top_k'])
         c_emb = self.model.encode(candidates, convert_to_tensor=False)
         scores = np.dot(q_emb, c_emb.T).flatten()
         idx = np.argmax(scores)
@@ -189,6 +324,61 @@ class QueryProcessor:
 
         return entities
 
+    def extract_numeric_ranges(self, query):
+        """
+        Extract numeric range predicates such as "since 2000", "between 1996 and 2008"
+        or "athletes under 20".
+
+        Runs on the raw query because preprocessing drops words like "between" and "under".
+
+        Args:
+            query (str): The original query
+
+        Returns:
+            dict: Numeric field ('year', 'age', 'height', 'weight') to a list of
+                (operator, value) predicates
+        """
+        text = query.lower()
+        ranges = {}
+
+        def add(field, ops, values, span):
+            nonlocal text
+            for op, value in zip(ops, values):
+                ranges.setdefault(field, []).append((op, float(value)))
+            # Blank out the match so later patterns don't reuse its numbers
+            text = text[:span[0]] + ' ' * (span[1] - span[0]) + text[span[1]:]
+
+        for pattern, field, ops in RANGE_PATTERNS:
+            for match in re.finditer(pattern, text):
+                add(field, ops, match.groups(), match.span())
+
+        for match in re.finditer(rf'\b(year|age|height|weight)s? (?:of )?({COMPARATOR_RE}) {NUMBER_RE}', text):
+            add(FIELD_NAMES[match.group(1)], (COMPARATORS[match.group(2)],), (match.group(3),), match.span())
+
+        for match in re.finditer(rf'\b({COMPARATOR_RE}) {NUMBER_RE} ?(kg|cm)\b', text):
+            add(UNIT_FIELDS[match.group(3)], (COMPARATORS[match.group(1)],), (match.group(2),), match.span())
+
+        # A bare "under 20" / "over 30" reads as an age bound only in a query about
+        # athletes or ages; "countries with over 30 gold medals" is a medal count
+        if AGE_CONTEXT_RE.search(text):
+            for match in BARE_AGE_RE.finditer(text):
+                if AGE_BOUNDS[0] <= int(match.group(2)) <= AGE_BOUNDS[1]:
+                    add('age', (COMPARATORS[match.group(1)],), (match.group(2),), match.span())
+
+        return ranges
+
+    def is_follow_up(self, query):
+        """
+        Tell whether a query continues the previous one in a conversation.
+
+        Args:
+            query (str): The natural language query
+
+        Returns:
+            bool: True for follow-ups such as "only swimming" or "of those, just gold"
+        """
+        return bool(FOLLOW_UP_RE.search(query.strip().lower()))
+
     def determine_query_intent(self, query, entities):
         """
         Classify intent using semantic similarity.
@@ -231,15 +421,31 @@ class QueryProcessor:
         if df is not None:
             self.df = df
 
+        stage_start = time.time()
         preprocessed_query = self.preprocess_query(query)
+        match_start = time.time()
         entities = self.match_entities(preprocessed_query)
+        entities['ranges'] = self.extract_numeric_ranges(query)
+        if entities['ranges']:
+            # Numbers that are range bounds are not a single year or a result count
+            bounds = {value for predicates in entities['ranges'].values() for _, value in predicates}
+            if 'year' in entities['ranges'] or (entities['year'] and float(entities['year']) in bounds):
+                entities['year'] = None
+            if entities['quantity'] is not None and float(entities['quantity']) in bounds:
+                entities['quantity'] = None
+        intent_start = time.time()
         intent = self.determine_query_intent(query, entities)
 
         query_params = {
             'intent': intent,
             'filters': {},
             'entities': entities,
-            'original_query': query
+            'original_query': query,
+            'timings': {
+                'preprocess': match_start - stage_start,
+                'match_entities': intent_start - match_start,
+                'determine_intent': time.time() - intent_start
+            }
         }
 
         if entities['country']:
@@ -254,6 +460,8 @@ class QueryProcessor:
             query_params['filters']['athlete'] = entities['athlete']
         if entities['quantity']:
             query_params['filters']['limit'] = entities['quantity']
+        if entities['ranges']:
+            query_params['filters']['ranges'] = entities['ranges']
 
         end_time = time.time()
         print(f"Total query processing time: {end_time - start_time:.2f} seconds")
@@ -1,16 +1,27 @@
 # modules/response_generator.py
 
-from llm_utils import LocalLLM
+from .llm_utils import LocalLLM
 import pandas as pd
 import time
+from config import GENERATION
+
+# Fixed start of every prompt. It comes first so LocalLLM can resume from its cached KV state.
+SYSTEM_PROMPT = """
+You are an Olympic assistant. Based on the following data, clearly answer the user's question.
+"""
 
 class ResponseGenerator:
-    def __init__(self):
+    def __init__(self, llm=None):
         """
         Initialize the response generator with an LLM for natural language generation.
+
+        Args:
+            llm (optional): LLM to use instead of loading LocalLLM
         """
         start_time = time.time()
-        self.llm = LocalLLM()
+        self.llm = llm or LocalLLM(prompt_prefix=SYSTEM_PROMPT)
+        # Timings and prompt size of the last call, for the slow-query log
+        self.last_stats = {}
         print(f"ResponseGenerator initialization completed in {time.time() - start_time:.2f} seconds")
     
     def generate_response(self, query, results, entities, intent):
@@ -27,16 +38,45 @@ class ResponseGenerator:
             str: Natural language explanation
         """
         start_time = time.time()
+        self.last_stats = {}
         if results.empty:
             response = self._generate_no_result_message(entities)
             print(f"Empty result response generated in {time.time() - start_time:.2f} seconds")
             return response
 
         prompt = self._build_prompt(query, results, entities, intent)
-        response = self.llm.generate_response(prompt)
+        budget = self.generation_budget(intent)
+        generation_start = time.time()
+        response = self.llm.generate_response(prompt, max_new_tokens=budget['max_new_tokens'], stop=budget['stop'])
+        self.last_stats = {
+            'prompt_build': generation_start - start_time,
+            'generation': time.time() - generation_start,
+            'prompt_tokens': self.llm.last_stats.get('prompt_tokens'),
+            'reused_tokens': self.llm.last_stats.get('reused_tokens'),
+            'generated_tokens': self.llm.last_stats.get('generated_tokens'),
+            'max_new_tokens': self.llm.last_stats.get('max_new_tokens')
+        }
         print(f"Full response generation completed in {time.time() - start_time:.2f} seconds")
         return response
     
+    @staticmethod
+    def generation_budget(intent):
+        """
+        Return the generation settings for an intent.
+
+        Args:
+            intent (str): Intent like 'filter', 'ranking', 'analysis'
+
+        Returns:
+            dict: 'max_new_tokens', 'stop' sequences and 'length_hint' (or None)
+        """
+        settings = {**GENERATION['default'], **GENERATION['intents'].get(intent, {})}
+        return {
+            'max_new_tokens': settings['max_new_tokens'],
+            'stop': GENERATION['stop'] + settings.get('stop', []),
+            'length_hint': settings.get('length_hint') if GENERATION['length_hints'] else None
+        }
+
     def _build_prompt(self, query, results, entities, intent):
         """
         Build a structured prompt for the LLM based on user input and results.
@@ -61,22 +101,26 @@ class ResponseGenerator:
             context.append(f"Medal Type: {entities['medal_type'].title()}")
         if entities.get('city'):
             context.append(f"Host City: {entities['city']}")
+        for field, predicates in (entities.get('ranges') or {}).items():
+            context.append(f"{field.title()}: " + " and ".join(f"{op} {value:g}" for op, value in predicates))
         
         # Get available columns from results
         available_columns = results.columns.tolist()
+        length_hint = self.generation_budget(intent)['length_hint']
+        length_line = f"Answer in {length_hint}.\n" if length_hint else ""
         
-        # Build full prompt
-        prompt = f"""
-You are an Olympic assistant. Based on the following data, clearly answer the user's question.
-
-User Question: "{query}"
-Intent: {intent}
+        # Build full prompt, most stable parts first: the system prompt, then the
+        # filters and data shared by follow-up questions, and the question last
+        prompt = SYSTEM_PROMPT + f"""
 Context: {", ".join(context) if context else "No filters"}
 
 Filtered Data:
 {results.to_string(index=False) if not results.empty else "No results found"}
 
-Answer:
+Intent: {intent}
+User Question: "{query}"
+
+{length_line}Answer:
 """
         print(f"Prompt building completed in {time.time() - start_time:.2f} seconds")
         return prompt
@@ -1,6 +1,10 @@
+import importlib
+import io
 import pandas as pd
+from config import SEARCH
 from .query_processor import QueryProcessor
 from .data_handler import DataHandler
+from .session_store import SessionStore
 import nltk
 
 # Ensure the punkt tokenizer is available for NLTK tokenization
@@ -17,6 +21,7 @@ class SearchEngine:
         """
         self.data_handler = DataHandler(csv_path=csv_path, df=df)
         self.query_processor = QueryProcessor()
+        self.sessions = SessionStore()
         
         # If data is loaded, learn schema from it
         if csv_path or df is not None:
@@ -24,7 +29,7 @@ class SearchEngine:
     
     def learn_data_schema(self):
         """Learn schema from the loaded data to help with query processing."""
-        self.query_processor.learn_from_data(self.data_handler.df)
+        self.query_processor.learn_from_data(self.data_handler.entity_frame())
     
     def load_data(self, csv_path):
         """
@@ -37,57 +42,207 @@ class SearchEngine:
         self.query_processor.learn_from_data(df)
         return df
     
-    def search(self, query):
+    def search(self, query, session_id=None):
         """
         Process a natural language query and search the data.
         
         Args:
             query (str): Natural language query
+            session_id (str, optional): Conversation id; follow-ups such as "only gold"
+                narrow the results of the session's previous query
             
         Returns:
-            tuple: (DataFrame with results, dict with additional info/analysis)
+            tuple: (DataFrame with results, dict with query parameters, dict with additional info/analysis)
         """
         # Process the query into structured parameters
         query_params = self.query_processor.process_query(query, self.data_handler.df)
         
-        # Search the data using the parameters
-        results, analysis_info = self.data_handler.search_data(query_params)
+        # Search the data using the parameters, merged with the previous turn for follow-ups
+        query_params, results, analysis_info = self.sessions.search(
+            session_id, query_params, self.data_handler, self.query_processor.is_follow_up(query)
+        )
         
         return results, query_params, analysis_info
     
-    def format_results(self, results, query_params, analysis_info):
+    def format_results(self, results, query_params, analysis_info, page_size=None, offset=0, cursor=None):
         """
-        Format search results into a readable response.
+        Format one page of search results into a readable response.
         
         Args:
             results (DataFrame): Search results
             query_params (dict): Query parameters
             analysis_info (dict): Analysis information
+            page_size (int, optional): Rows per page, defaults to SEARCH['page_size']
+            offset (int): Position of the first row of the page
+            cursor (int, optional): Row id of the last row of the previous page
             
+        Returns:
+            dict: Formatted results
+        """
+        page = paginate(results, page_size=page_size, offset=offset, cursor=cursor)
+        page['columns'] = list(results.columns) if not results.empty else []
+        return self.format_page(page, query_params, analysis_info)
+
+    def format_page(self, page, query_params, analysis_info):
+        """
+        Format a page from DataHandler.search_page or paginate into a readable response.
+
+        Args:
+            page (dict): Page rows, columns, total and next offset/cursor
+            query_params (dict): Query parameters
+            analysis_info (dict): Analysis information
+
         Returns:
             dict: Formatted results
         """
         response = {
             "original_query": query_params.get('original_query', ''),
-            "result_count": len(results),
-            "data": results.to_dict('records') if not results.empty else [],
-            "columns": list(results.columns) if not results.empty else [],
+            "result_count": page['total'],
+            "data": page['rows'].to_dict('records') if not page['rows'].empty else [],
+            "columns": page['columns'] if page['total'] else [],
+            "next_offset": page['next_offset'],
+            "next_cursor": page['next_cursor'],
             "intent": query_params.get('intent', 'filter'),
+            "follow_up": query_params.get('follow_up', False),
             "analysis": analysis_info
         }
         
         return response
+
+    def export_results(self, query, fmt="ndjson", chunksize=None):
+        """
+        Run a query and stream every matching row in an export format.
+        
+        Args:
+            query (str): Natural language query
+            fmt (str): "ndjson" or "arrow" (Arrow IPC stream, requires pyarrow)
+            chunksize (int, optional): Rows serialized per chunk
+            
+        Returns:
+            generator: Encoded chunks of the export
+        """
+        query_params = self.query_processor.process_query(query, self.data_handler.df)
+        chunks = self.data_handler.iter_search_data(query_params, chunksize=chunksize or SEARCH['export_chunksize'])
+        return stream_results(chunks, fmt=fmt)
     
-    def process_query(self, query):
+    def process_query(self, query, page_size=None, offset=0, cursor=None, session_id=None):
         """
         Complete end-to-end processing of a query.
         
         Args:
             query (str): Natural language query
+            page_size (int, optional): Rows per page
+            offset (int): Position of the first row of the page
+            cursor (int, optional): Row id of the last row of the previous page
+            session_id (str, optional): Conversation id for follow-up queries
             
         Returns:
             dict: Formatted results and analysis
         """
-        results, query_params, analysis_info = self.search(query)
-        formatted_response = self.format_results(results, query_params, analysis_info)
-        return formatted_response
\ No newline at end of file
+        query_params = self.query_processor.process_query(query, self.data_handler.df)
+        query_params, page, analysis_info = self.sessions.search_page(
+            session_id, query_params, self.data_handler, self.query_processor.is_follow_up(query),
+            page_size=page_size, offset=offset, cursor=cursor
+        )
+        return self.format_page(page, query_params, analysis_info)
+
+
+def paginate(results, page_size=None, offset=0, cursor=None):
+    """
+    Select one page of results without materializing the rest.
+
+    When the results keep the frame's row order, the cursor is the row id of the
+    last row already returned and the page starts right after it (keyset
+    pagination). Ranked results are paged by offset.
+
+    Args:
+        results (DataFrame): Search results
+        page_size (int, optional): Rows per page, defaults to SEARCH['page_size']
+        offset (int): Position of the first row of the page
+        cursor (int, optional): Row id of the last row of the previous page
+
+    Returns:
+        dict: Page rows, total row count and the offset/cursor of the next page
+    """
+    page_size = page_size or SEARCH['page_size']
+    total = len(results.index)
+    keyset = results.index.is_monotonic_increasing
+
+    if cursor is not None and keyset:
+        start = int(results.index.searchsorted(cursor, side='right'))
+    else:
+        start = offset
+    rows = results.iloc[start:start + page_size]
+    end = start + len(rows)
+
+    has_more = end < total
+    return {
+        'rows': rows,
+        'total': total,
+        'next_offset': end if has_more else None,
+        'next_cursor': int(rows.index[-1]) if has_more and keyset and len(rows) else None
+    }
+
+
+# Library each export format needs, checked before a response starts streaming
+EXPORT_DEPENDENCIES = {"ndjson": None, "arrow": "pyarrow"}
+
+
+def missing_export_dependency(fmt):
+    """
+    Name the library an export format needs if it cannot be imported.
+
+    Args:
+        fmt (str): Export format, a key of EXPORT_DEPENDENCIES
+
+    Returns:
+        str: Missing module name, None if the format can be written
+    """
+    module = EXPORT_DEPENDENCIES.get(fmt)
+    if module is None:
+        return None
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return module
+    return None
+
+
+def stream_results(chunks, fmt="ndjson"):
+    """
+    Serialize result chunks one at a time for a streaming export.
+
+    Args:
+        chunks (iterable): DataFrames, e.g. from DataHandler.iter_search_data; an empty
+            frame still contributes its columns to the Arrow schema
+        fmt (str): "ndjson" or "arrow" (Arrow IPC stream, requires pyarrow)
+
+    Yields:
+        bytes: Encoded chunks
+    """
+    if fmt == "ndjson":
+        for chunk in chunks:
+            if not chunk.empty:
+                yield chunk.to_json(orient='records', lines=True).rstrip('\n').encode() + b'\n'
+    elif fmt == "arrow":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ValueError("Arrow export requires pyarrow to be installed")
+        sink = io.BytesIO()
+        writer = None
+        for chunk in chunks:
+            batch = pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        if writer is None:
+            # No rows: still write the schema so readers get a valid, empty stream
+            writer = pa.ipc.new_stream(sink, pa.schema([]))
+        writer.close()
+        yield sink.getvalue()
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
\ No newline at end of file
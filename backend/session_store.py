@@ -0,0 +1,212 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from config import SESSIONS
+
+
+def merge_filters(previous, new):
+    """
+    Merge a follow-up's filters into those of the previous turn.
+
+    Args:
+        previous (dict): Filters of the previous turn
+        new (dict): Filters extracted from the follow-up
+
+    Returns:
+        dict: Merged filters
+        bool: Whether the merge only narrows the previous filters, so the
+            follow-up can be evaluated against the previous result rows
+    """
+    merged = dict(previous)
+    narrowing = True
+    for key, value in new.items():
+        if key == 'ranges':
+            # Range predicates are conjunctive, so adding more always narrows
+            ranges = {field: list(predicates) for field, predicates in previous.get('ranges', {}).items()}
+            for field, predicates in value.items():
+                ranges.setdefault(field, []).extend(p for p in predicates if p not in ranges[field])
+            merged['ranges'] = ranges
+            continue
+        if key != 'limit' and key in previous and previous[key] != value:
+            # "what about 2012" after "in 2008" replaces a filter instead of narrowing it
+            narrowing = False
+        merged[key] = value
+    return merged, narrowing
+
+
+class SessionStore:
+    def __init__(self, max_sessions=None, idle_seconds=None, row_id_budget=None):
+        """
+        Keep each conversation's last resolved filters and result rows so
+        follow-up queries narrow the previous results instead of starting over.
+
+        Args:
+            max_sessions (int, optional): Sessions kept, least recently used are dropped first
+            idle_seconds (float, optional): Sessions idle for longer expire
+            row_id_budget (int, optional): Row ids retained across all sessions
+        """
+        self.max_sessions = max_sessions or SESSIONS["max_sessions"]
+        self.idle_seconds = idle_seconds or SESSIONS["idle_seconds"]
+        self.row_id_budget = row_id_budget or SESSIONS["row_id_budget"]
+
+        # session_id -> {'dataset', 'filters', 'entities', 'row_ids', 'turns', 'last_used'},
+        # ordered from least to most recently used
+        self.sessions = OrderedDict()
+        self.counters = {'turns': 0, 'follow_ups': 0, 'narrowed': 0, 'expired': 0, 'evicted': 0}
+        self._lock = threading.Lock()
+
+    def resolve(self, session_id, query_params, follow_up, dataset=None, preview=False):
+        """
+        Merge a follow-up query into its session's previous turn.
+
+        Args:
+            session_id (str): Conversation id
+            query_params (dict): Parameters from QueryProcessor.process_query
+            follow_up (bool): Whether the query continues the previous turn
+            dataset (str, optional): Dataset the query runs against
+            preview (bool): Resolve a copy without counting a turn, e.g. for speculative queries
+
+        Returns:
+            dict: Query parameters with merged filters and entities, and 'row_ids'
+                holding the previous result rows when the follow-up only narrows them.
+                A follow-up giving its own value for a filter the session already has
+                ("what about China" after "USA medals") runs as a fresh query.
+        """
+        if preview:
+            query_params = dict(query_params)
+        counters = Counter() if preview else self.counters
+        with self._lock:
+            self._expire()
+            session = self.sessions.get(session_id)
+            query_params['follow_up'] = False
+            if not follow_up or session is None or session['dataset'] != dataset:
+                return query_params
+
+            filters, narrowing = merge_filters(session['filters'], query_params['filters'])
+            if not narrowing:
+                return query_params
+
+            counters['follow_ups'] += 1
+            entities = dict(session['entities'])
+            entities.update({k: v for k, v in query_params['entities'].items() if v})
+            entities['ranges'] = filters.get('ranges', {})
+            query_params.update({'filters': filters, 'entities': entities, 'follow_up': True})
+            if session['row_ids'] is not None:
+                query_params['row_ids'] = session['row_ids']
+                counters['narrowed'] += 1
+            return query_params
+
+    def save(self, session_id, query_params, row_ids, dataset=None):
+        """
+        Record a turn's resolved filters and result rows as the session's state.
+
+        Args:
+            session_id (str): Conversation id
+            query_params (dict): Resolved query parameters of the turn
+            row_ids (ndarray): Positions of the result rows in the dataset
+            dataset (str, optional): Dataset the query ran against
+        """
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        with self._lock:
+            previous = self.sessions.pop(session_id, None)
+            self.sessions[session_id] = {
+                'dataset': dataset,
+                'filters': query_params['filters'],
+                'entities': query_params['entities'],
+                # Result sets larger than the whole budget keep only their filters
+                'row_ids': row_ids if len(row_ids) <= self.row_id_budget else None,
+                'turns': (previous['turns'] if previous else 0) + 1,
+                'last_used': time.time()
+            }
+            self.counters['turns'] += 1
+            self._enforce_budget(keep=session_id)
+
+    def search(self, session_id, query_params, data_handler, follow_up, dataset=None):
+        """
+        Run a query within a session: resolve it against the previous turn,
+        search, and keep the results for the next turn.
+
+        Args:
+            session_id (str, optional): Conversation id, None for a one-off query
+            query_params (dict): Parameters from QueryProcessor.process_query
+            data_handler (DataHandler): Handler for the dataset
+            follow_up (bool): Whether the query continues the previous turn
+            dataset (str, optional): Dataset the query runs against
+
+        Returns:
+            tuple: (resolved query_params, DataFrame with results, dict with additional info)
+        """
+        if session_id is None:
+            results, info = data_handler.search_data(query_params)
+            return query_params, results, info
+
+        query_params = self.resolve(session_id, query_params, follow_up, dataset=dataset)
+        results, info = data_handler.search_data(query_params)
+        self.save(session_id, query_params, data_handler.row_positions(results), dataset=dataset)
+        return query_params, results, info
+
+    def search_page(self, session_id, query_params, data_handler, follow_up, dataset=None, **page_args):
+        """
+        Like search, but build only one page of the results (DataHandler.search_page).
+
+        Args:
+            session_id (str, optional): Conversation id, None for a one-off query
+            query_params (dict): Parameters from QueryProcessor.process_query
+            data_handler (DataHandler): Handler for the dataset
+            follow_up (bool): Whether the query continues the previous turn
+            dataset (str, optional): Dataset the query runs against
+            **page_args: page_size, offset and cursor for DataHandler.search_page
+
+        Returns:
+            tuple: (resolved query_params, dict with the page, dict with additional info)
+        """
+        if session_id is None:
+            page, info = data_handler.search_page(query_params, **page_args)
+            return query_params, page, info
+
+        query_params = self.resolve(session_id, query_params, follow_up, dataset=dataset)
+        page, info = data_handler.search_page(query_params, row_ids=True, **page_args)
+        self.save(session_id, query_params, page['row_ids'], dataset=dataset)
+        return query_params, page, info
+
+    def end(self, session_id):
+        """Forget a session."""
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_seconds
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session['last_used'] >= cutoff:
+                break
+            del self.sessions[session_id]
+            self.counters['expired'] += 1
+
+    def _row_id_count(self):
+        return sum(len(s['row_ids']) for s in self.sessions.values() if s['row_ids'] is not None)
+
+    def _enforce_budget(self, keep=None):
+        """Drop the least recently used sessions beyond the session and row id limits."""
+        self._expire()
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_sessions or self._row_id_count() > self.row_id_budget
+        ):
+            coldest = next(session_id for session_id in self.sessions if session_id != keep)
+            del self.sessions[coldest]
+            self.counters['evicted'] += 1
+
+    def stats(self):
+        """Return session counts, retained row ids and turn counters."""
+        with self._lock:
+            self._expire()
+            row_ids = self._row_id_count()
+            return {
+                'sessions': len(self.sessions),
+                'retained_row_ids': row_ids,
+                'retained_mb': round(row_ids * 8 / 1024 / 1024, 2),
+                **self.counters
+            }
@@ -0,0 +1,155 @@
+"""
+Entity vocabularies and embeddings shared by all server worker processes.
+
+The first process to need a dataset's entity state builds it under a file lock
+and publishes it as read-only .npy files; every worker then memory-maps them, so
+the matrices sit once in the page cache instead of once per worker. The state
+can also be built ahead of time by a loader process:
+
+    python -m backend.shared_entities data/olympic.csv
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from config import EMBEDDING, SHARED_ENTITIES
+from .entity_store import load_entity_state, save_entity_state
+
+try:
+    import fcntl
+except ImportError:     # Windows: no lock, concurrent builders publish identical files
+    fcntl = None
+
+
+def dataset_key(csv_path):
+    """
+    Identify a dataset file together with the settings its entity state depends on.
+
+    Args:
+        csv_path (str): Path to the CSV file
+
+    Returns:
+        str: Key that changes when the file, the embedding model or the storage dtype changes
+    """
+    stat = os.stat(csv_path)
+    fingerprint = f"{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}|{EMBEDDING['model_name']}|{EMBEDDING['dtype']}"
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+
+
+class SharedEntityCache:
+    def __init__(self, cache_dir=None, lock_timeout=None):
+        """
+        Publish entity state once and map it read-only in every process.
+
+        Args:
+            cache_dir (str, optional): Directory holding the published state
+            lock_timeout (float, optional): Seconds to wait for another process's build
+        """
+        self.cache_dir = cache_dir or SHARED_ENTITIES["cache_dir"]
+        self.lock_timeout = lock_timeout or SHARED_ENTITIES["lock_timeout_seconds"]
+        # key -> {'built': whether this process built it, 'seconds': time to build or attach}
+        self.attached = {}
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def is_published(self, key):
+        return os.path.isfile(os.path.join(self.path_for(key), "READY"))
+
+    @contextmanager
+    def _lock(self, key):
+        """Hold an exclusive lock on a key across processes while it is built."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f"{key}.lock"), "w") as f:
+            if fcntl is not None:
+                deadline = time.time() + self.lock_timeout
+                while True:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.time() > deadline:
+                            raise TimeoutError(f"Timed out waiting for the entity state build of {key}")
+                        time.sleep(0.2)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, key, state):
+        """Write entity state and mark it ready; readers never see a partial directory."""
+        path = self.path_for(key)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        save_entity_state(state, tmp_path)
+        open(os.path.join(tmp_path, "READY"), "w").close()
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+    def load_or_build(self, key, build):
+        """
+        Map a dataset's published entity state, building and publishing it first
+        if no process has yet.
+
+        Args:
+            key (str): Dataset key, see dataset_key
+            build (callable): Returns entity state (QueryProcessor.get_entity_state) when called
+
+        Returns:
+            dict: Entity state whose store arrays are read-only memory maps
+        """
+        start_time = time.time()
+        built = False
+        if not self.is_published(key):
+            with self._lock(key):
+                # Another worker may have published it while we waited
+                if not self.is_published(key):
+                    self.publish(key, build())
+                    built = True
+
+        state = load_entity_state(self.path_for(key), mmap_mode="r")
+        self.attached[key] = {'built': built, 'seconds': round(time.time() - start_time, 2)}
+        print(f"Entity state {key} {'built and ' if built else ''}mapped in {time.time() - start_time:.2f} seconds")
+        return state
+
+    def stats(self):
+        """Report the entity state this process has attached."""
+        return {
+            'pid': os.getpid(),
+            'attached': {
+                key: {**info, 'mapped_mb': round(_dir_bytes(self.path_for(key)) / 1024 / 1024, 1)}
+                for key, info in self.attached.items()
+            }
+        }
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and publish the entity state of datasets for the server workers")
+    parser.add_argument("csv_paths", nargs="+", help="Dataset CSV files")
+    parser.add_argument("--cache-dir", help="Defaults to SHARED_ENTITIES['cache_dir']")
+    args = parser.parse_args()
+
+    from .data_handler import DataHandler
+    from .query_processor import QueryProcessor
+    processor = QueryProcessor()
+    cache = SharedEntityCache(cache_dir=args.cache_dir)
+    for csv_path in args.csv_paths:
+        def build():
+            processor.learn_from_data(DataHandler(csv_path=csv_path).df)
+            return processor.get_entity_state()
+        cache.load_or_build(dataset_key(csv_path), build)
+        print(f"Published entity state for {csv_path} to {cache.path_for(dataset_key(csv_path))}")
+
+
+if __name__ == "__main__":
+    main()
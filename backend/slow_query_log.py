@@ -0,0 +1,156 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from config import SLOW_QUERY_LOG
+
+
+class StageTimer:
+    def __init__(self):
+        """Collect wall-clock timings for the named stages of one request."""
+        self.start_time = time.time()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as a stage."""
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.time() - start_time, 4)
+
+    def add(self, timings):
+        """Merge timings measured elsewhere (e.g. inside QueryProcessor)."""
+        self.timings.update({name: round(t, 4) for name, t in timings.items()})
+
+    def total(self):
+        return time.time() - self.start_time
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval=None):
+        """
+        Sample the stack of one thread at a fixed interval.
+
+        Samples are written in the folded-stack format ("outer;inner;leaf count")
+        read by flamegraph.pl, speedscope and inferno.
+
+        Args:
+            thread_id (int, optional): Thread to sample, defaults to the calling thread
+            interval (float, optional): Seconds between samples
+        """
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or SLOW_QUERY_LOG["profile_interval_ms"] / 1000
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Write the collected samples as folded stacks."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class SlowQueryLog:
+    def __init__(self, settings=None):
+        """
+        Record requests slower than a threshold, optionally with a stack profile.
+
+        Args:
+            settings (dict, optional): Overrides for config.SLOW_QUERY_LOG
+        """
+        self.settings = {**SLOW_QUERY_LOG, **(settings or {})}
+        self._lock = threading.Lock()
+
+    def should_profile(self, headers=None):
+        """
+        Decide whether to profile a request: when its profile header is set, or
+        for a random fraction of requests.
+
+        Args:
+            headers (Mapping, optional): Request headers
+
+        Returns:
+            bool: Whether to attach the profiler
+        """
+        if not self.settings["enabled"]:
+            return False
+        if headers is not None and headers.get(self.settings["profile_header"]):
+            return True
+        return random.random() < self.settings["profile_sample_rate"]
+
+    @contextmanager
+    def track(self, query, headers=None):
+        """
+        Time a request, profiling it if selected, and log it if it was slow.
+
+        Yields:
+            dict: Entry to fill in with query_params, row counts, token counts and timings
+        """
+        timer = StageTimer()
+        entry = {'query': query, 'timer': timer}
+        profiler = SamplingProfiler().start() if self.should_profile(headers) else None
+        try:
+            yield entry
+        except Exception as e:
+            entry['error'] = str(e)
+            raise
+        finally:
+            if profiler is not None:
+                profiler.stop()
+            self.record(entry, timer.total(), profiler)
+
+    def record(self, entry, total, profiler=None):
+        """Append the entry to the log if the request exceeded the threshold."""
+        if not self.settings["enabled"] or total < self.settings["threshold_seconds"]:
+            return
+
+        timer = entry.pop('timer', None)
+        record = {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'total_seconds': round(total, 3),
+            **entry,
+            'timings': timer.timings if timer else {}
+        }
+        if profiler is not None and profiler.stacks:
+            profile_path = os.path.join(
+                self.settings["profile_dir"], f"slow_{time.strftime('%Y%m%d_%H%M%S')}_{id(profiler):x}.folded"
+            )
+            profiler.write(profile_path)
+            record['profile'] = profile_path
+
+        log_path = self.settings["log_path"]
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with self._lock, open(log_path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        print(f"Slow query ({total:.2f} seconds) logged to {log_path}")
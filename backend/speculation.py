@@ -0,0 +1,78 @@
+"""
+Speculative query processing on partial voice transcripts.
+
+Kept apart from voice_input, which loads Whisper and a dataset at import time.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .data_handler import search_key
+
+def normalize_transcript(text):
+    """Lowercase a transcript and drop punctuation, so partials and the final text compare equal."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+def stable_prefix(previous, current):
+    """Words two consecutive partial transcripts agree on; later audio rarely changes them."""
+    words = []
+    for a, b in zip(previous.split(), current.split()):
+        if a != b:
+            break
+        words.append(a)
+    return " ".join(words)
+
+class SpeculativeQuery:
+    def __init__(self, processor, handler, resolve):
+        """
+        Run entity matching and filtering on partial transcripts in the
+        background, so the final transcript can reuse the work.
+
+        Args:
+            processor (QueryProcessor): Query processor
+            handler (DataHandler): Handler for the dataset
+            resolve (callable): Maps (query, query_params) to the parameters search_data
+                would get, e.g. merged with the conversation's previous turn
+        """
+        self.processor = processor
+        self.handler = handler
+        self.resolve = resolve
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.latest = None
+        self.result = None
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """Speculate on a partial transcript; superseded partials are skipped."""
+        with self._lock:
+            self.latest = text
+        self.executor.submit(self._run, text)
+
+    def _run(self, text):
+        with self._lock:
+            if text != self.latest:
+                return
+        start_time = time.time()
+        query_params = self.processor.process_query(text)
+        process_seconds = time.time() - start_time
+
+        resolved = self.resolve(text, query_params)
+        key = search_key(resolved)
+        if self.result is not None and self.result['key'] == key:
+            # A longer partial that resolves to the same search keeps the earlier results
+            results, info, search_seconds = self.result['results'], self.result['info'], self.result['search_seconds']
+        else:
+            search_start = time.time()
+            results, info = self.handler.search_data(resolved)
+            search_seconds = time.time() - search_start
+        self.runs += 1
+        self.result = {
+            'text': text, 'query_params': query_params, 'key': key, 'results': results, 'info': info,
+            'process_seconds': process_seconds, 'search_seconds': search_seconds
+        }
+
+    def finish(self):
+        """Wait for the speculation in flight and return the latest result."""
+        self.executor.shutdown(wait=True)
+        return self.result
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import SQL_ENGINE
+
+TABLE = "data"
+META_TABLE = "meta"
+# Range predicate operators and their SQL
+RANGE_OPERATORS = {'<': '<', '<=': '<=', '>': '>', '>=': '>=', '=': '=', '==': '='}
+
+
+def _quote(name):
+    """Quote a column name for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def source_fingerprint(csv_path=None, df=None):
+    """
+    Identify the data a database was ingested from.
+
+    Args:
+        csv_path (str, optional): CSV file, identified by path, size and modification time
+        df (DataFrame, optional): Frame, identified by a hash of its columns and values
+
+    Returns:
+        str or None: Fingerprint, None when there is no source
+    """
+    if csv_path:
+        stat = os.stat(csv_path)
+        fingerprint = f"csv|{os.path.abspath(csv_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    elif df is not None:
+        values = pd.util.hash_pandas_object(df, index=False).values.tobytes()
+        fingerprint = f"df|{list(df.columns)}|{hashlib.sha1(values).hexdigest()}"
+    else:
+        return None
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+class SQLiteStore:
+    def __init__(self, db_path=None, csv_path=None, df=None, chunksize=None):
+        """
+        Keep a dataset in an on-disk SQLite database instead of a pandas frame.
+
+        Args:
+            db_path (str, optional): Path to the SQLite database file
+            csv_path (str, optional): CSV file to ingest unless the database already holds it
+            df (DataFrame, optional): Frame to ingest unless the database already holds it
+            chunksize (int, optional): Rows per chunk when ingesting and streaming results
+        """
+        self.db_path = db_path or SQL_ENGINE["db_path"]
+        self.chunksize = chunksize or SQL_ENGINE["chunksize"]
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        # column -> distinct values, read once per store for filter matching
+        self._distinct = {}
+
+        # Re-ingest when the database was built from another or an older source
+        fingerprint = source_fingerprint(csv_path, df)
+        if fingerprint is not None and fingerprint != self._meta('source'):
+            self.conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            if csv_path:
+                self._ingest(pd.read_csv(csv_path, chunksize=self.chunksize))
+            else:
+                self._ingest([df])
+            self.conn.execute(f"INSERT OR REPLACE INTO {META_TABLE} VALUES ('source', ?)", (fingerprint,))
+            self.conn.commit()
+
+        self.columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({TABLE})")] if self._has_table() else []
+
+    def _meta(self, key):
+        row = self.conn.execute(f"SELECT value FROM {META_TABLE} WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _has_table(self):
+        row = self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?", (TABLE,)
+        ).fetchone()
+        return row is not None
+
+    def _ingest(self, chunks):
+        """Append frames chunk by chunk and index the columns used for filtering."""
+        start_time = time.time()
+        rows = 0
+        for chunk in chunks:
+            chunk.to_sql(TABLE, self.conn, if_exists="append", index=False)
+            rows += len(chunk)
+
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({TABLE})")]
+        range_cols = [self._range_column(field, columns) for field in ('age', 'height', 'weight')]
+        for col in list(self._filter_columns(columns).values()) + range_cols:
+            if col:
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + col)} ON {TABLE} ({_quote(col)})"
+                )
+        # Collect index statistics so SQLite's planner can order predicates by selectivity
+        self.conn.execute("ANALYZE")
+        self.conn.commit()
+        print(f"Ingested {rows} rows into {self.db_path} in {time.time() - start_time:.2f} seconds")
+
+    @staticmethod
+    def _filter_columns(columns):
+        """Map filter names to the columns DataHandler.search_data uses for them."""
+        return {
+            'country': 'Team' if 'Team' in columns else ('Country' if 'Country' in columns else None),
+            'city': 'City' if 'City' in columns else None,
+            'year': next((col for col in columns if 'year' in col.lower()), None),
+            'athlete': 'Name' if 'Name' in columns else ('Athlete' if 'Athlete' in columns else None)
+        }
+
+    def _range_column(self, field, columns=None):
+        """Map a numeric range field ('year', 'age', ...) to its column."""
+        columns = columns if columns is not None else self.columns
+        if field == 'year':
+            return self._filter_columns(columns)['year']
+        return next((col for col in columns if col.lower() == field), None)
+
+    def row_count(self):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {TABLE}").fetchone()[0]
+
+    def sample(self, n=100):
+        """Return the first rows of the table, used for schema analysis."""
+        return pd.read_sql_query(f"SELECT * FROM {TABLE} LIMIT ?", self.conn, params=(n,))
+
+    def distinct(self, column):
+        """Return the distinct non-null values of a column, read from its index when one exists."""
+        query = f"SELECT DISTINCT {_quote(column)} FROM {TABLE} WHERE {_quote(column)} IS NOT NULL"
+        return pd.Series([row[0] for row in self.conn.execute(query)])
+
+    def entity_frame(self):
+        """
+        Return the distinct combinations of entity columns, enough for
+        QueryProcessor.learn_from_data without loading the full table.
+        """
+        cols = [col for col in self._filter_columns(self.columns).values() if col]
+        if not cols:
+            return pd.DataFrame()
+        col_sql = ", ".join(_quote(col) for col in cols)
+        return pd.read_sql_query(f"SELECT DISTINCT {col_sql} FROM {TABLE}", self.conn)
+
+    def _matching_values(self, column, term, as_str=False):
+        """
+        Resolve a substring filter to the exact column values it matches.
+
+        Matching runs over the column's distinct values, read once per store, with the
+        same pandas semantics as the in-memory path, so the query can use an indexed
+        IN lookup instead of a scan.
+        """
+        if column not in self._distinct:
+            self._distinct[column] = self.distinct(column)
+        values = self._distinct[column]
+        if as_str:
+            return values[values.astype(str).str.contains(term, na=False)].tolist()
+        return values[values.astype(str).str.contains(term, case=False, na=False)].tolist()
+
+    def compile(self, query_params, after=None, until=None):
+        """
+        Compile DataHandler.search_data parameters into a SQL query.
+
+        Args:
+            query_params (dict): Dictionary of search parameters
+            after (int, optional): Only rows with a larger row id, for keyset pagination
+            until (int, optional): Only rows with a row id up to this one
+
+        Returns:
+            tuple: (SQL string, list of bound parameters)
+        """
+        filters = query_params.get('filters', {})
+        filter_cols = self._filter_columns(self.columns)
+        where = []
+        params = []
+
+        for key in ('country', 'city', 'year', 'athlete'):
+            col = filter_cols[key]
+            if key not in filters or not col:
+                continue
+            values = self._matching_values(col, filters[key], as_str=(key == 'year'))
+            if not values:
+                where.append("0")
+                continue
+            # One bound JSON array, so large matches stay under SQLite's variable limit
+            where.append(f"{_quote(col)} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(values))
+
+        # Follow-up queries only look at the rows of the previous turn
+        if query_params.get('row_ids') is not None:
+            where.append("rowid IN (SELECT value + 1 FROM json_each(?))")
+            params.append(json.dumps([int(row_id) for row_id in query_params['row_ids']]))
+
+        # Range predicates are answered from the column indexes
+        for field, predicates in filters.get('ranges', {}).items():
+            col = self._range_column(field)
+            if not col:
+                continue
+            for op, value in predicates:
+                # Predicates may come back from the query log or a session, so only known operators reach the SQL
+                if op not in RANGE_OPERATORS:
+                    raise ValueError(f"Unsupported range operator: {op!r}")
+                where.append(f"{_quote(col)} {RANGE_OPERATORS[op]} ?")
+                params.append(float(value))
+
+        # Row ids are rowid - 1, so both bounds use the rowid index
+        if after is not None:
+            where.append("rowid > ?")
+            params.append(int(after) + 1)
+        if until is not None:
+            where.append("rowid <= ?")
+            params.append(int(until) + 1)
+
+        if 'medal_type' in filters and 'Medal' not in self.columns and filters['medal_type'] not in self.columns:
+            medal_col = filters['medal_type'].title()
+            if medal_col in ('Gold', 'Silver', 'Bronze') and medal_col in self.columns:
+                where.append(f"{_quote(medal_col)} > 0")
+
+        sql = f"SELECT rowid - 1 AS _row_id, * FROM {TABLE}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        order = "rowid"
+        limit = None
+        medal_col = self._ranking_column(query_params)
+        if medal_col:
+            direction = "ASC" if query_params.get('ascending', False) else "DESC"
+            order = f"{_quote(medal_col)} {direction}, rowid"
+            limit = query_params.get('limit', 10)
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def _ranking_column(self, query_params):
+        """Column ranking queries order by, None if the query is not ranked."""
+        if query_params.get('intent') != 'ranking':
+            return None
+        return next((col for col in ['Gold', 'Silver', 'Bronze', 'Total'] if col in self.columns), None)
+
+    def is_ranked(self, query_params):
+        """Whether results come in ranking order rather than row order."""
+        return self._ranking_column(query_params) is not None
+
+    def count(self, query_params, until=None):
+        """Count the rows a search returns, optionally only those up to a row id."""
+        sql, params = self.compile(query_params, until=until)
+        return self.conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def row_ids(self, query_params):
+        """Return the row ids of every result row without reading the other columns."""
+        sql, params = self.compile(query_params)
+        return np.array([row[0] for row in self.conn.execute(f"SELECT _row_id FROM ({sql})", params)], dtype=np.int64)
+
+    def page(self, query_params, limit, offset=0, after=None):
+        """
+        Fetch one page of results.
+
+        Args:
+            query_params (dict): Dictionary of search parameters
+            limit (int): Rows in the page
+            offset (int): Results skipped before the page
+            after (int, optional): Row id of the last row of the previous page, for
+                keyset pagination of unranked results
+
+        Returns:
+            DataFrame: Page rows, indexed by their original row position
+        """
+        sql, params = self.compile(query_params, after=after)
+        page = pd.read_sql_query(f"SELECT * FROM ({sql}) LIMIT ? OFFSET ?", self.conn, params=params + [limit, offset])
+        page = page.set_index('_row_id')
+        page.index.name = None
+        return page
+
+    def explain(self, query_params):
+        """Return SQLite's query plan for a search, one line per step."""
+        sql, params = self.compile(query_params)
+        return [row[-1] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+    def iter_query(self, query_params, chunksize=None):
+        """
+        Run a search and stream the results back chunk by chunk.
+
+        Args:
+            query_params (dict): Dictionary of search parameters
+            chunksize (int, optional): Rows per yielded frame
+
+        Yields:
+            DataFrame: Result rows, indexed by their original row position
+        """
+        sql, params = self.compile(query_params)
+        for chunk in pd.read_sql_query(sql, self.conn, params=params, chunksize=chunksize or self.chunksize):
+            chunk = chunk.set_index('_row_id')
+            chunk.index.name = None
+            yield chunk
@@ -0,0 +1,37 @@
+import time
+import zlib
+
+import numpy as np
+import torch
+
+
+class StubEmbeddingModel:
+    def __init__(self, dim=384, latency_ms=0.0):
+        """
+        Deterministic stand-in for SentenceTransformer used in load tests.
+
+        Texts are embedded as hashed, L2-normalized character trigram counts, so
+        similar strings still score high against each other.
+
+        Args:
+            dim (int): Embedding size
+            latency_ms (float): Simulated latency per encode call
+        """
+        self.dim = dim
+        self.latency = latency_ms / 1000
+
+    def encode(self, sentences, convert_to_tensor=False, convert_to_numpy=True, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        embeddings = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, text in enumerate(sentences):
+            text = f"  {str(text).lower()} "
+            for j in range(len(text) - 2):
+                embeddings[i, zlib.crc32(text[j:j + 3].encode()) % self.dim] += 1.0
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+        return torch.from_numpy(embeddings) if convert_to_tensor else embeddings
+
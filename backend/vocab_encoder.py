@@ -0,0 +1,128 @@
+"""
+Cold encoding of entity vocabularies.
+
+All entity types are encoded in one pass: names are deduplicated across types,
+sorted by length and cut into batches of similar length, so little of each batch
+is padding. Large vocabularies are spread over a pool of processes, each loading
+its own copy of the model and an even share of the CPU threads.
+"""
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from config import EMBEDDING
+
+# Model loaded by each pool process
+_worker_model = None
+
+
+def load_embedding_model():
+    """Load the configured sentence transformer; run in each pool process."""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING['model_name'])
+
+
+def _init_worker(model_loader, model, threads):
+    global _worker_model
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = model_loader() if model_loader is not None else model
+
+
+def _encode_batch(task):
+    i, names = task
+    return i, _worker_model.encode(names, batch_size=len(names), convert_to_numpy=True)
+
+
+@contextmanager
+def _batch_encoder(model, model_loader, processes):
+    """Yield a function mapping (index, names) batches to (index, embeddings), in any order."""
+    if processes == 1:
+        yield lambda tasks: ((i, model.encode(names, batch_size=len(names), convert_to_numpy=True)) for i, names in tasks)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    # spawn rather than fork: a forked copy of an initialized torch runtime can deadlock
+    context = multiprocessing.get_context("spawn")
+    initargs = (model_loader, None if model_loader else model, threads)
+    with context.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        yield lambda tasks: pool.imap_unordered(_encode_batch, tasks)
+
+
+def length_batches(names, batch_size):
+    """
+    Sort names by length and cut them into batches.
+
+    Args:
+        names (list): Distinct names
+        batch_size (int): Names per batch
+
+    Returns:
+        list: Batches of names, shortest first
+    """
+    ordered = sorted(names, key=len)
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+def encode_vocabularies(vocabularies, model, model_loader=None, processes=None, batch_size=None):
+    """
+    Encode the names of several entity types together.
+
+    Args:
+        vocabularies (dict): Entity type to list of names
+        model: Embedding model used in-process
+        model_loader (callable, optional): Loads the model in each pool process; without
+            it the model itself is sent to the processes
+        processes (int, optional): Pool size, defaults to EMBEDDING['encode_processes']
+        batch_size (int, optional): Defaults to EMBEDDING['encode_batch_size']
+
+    Returns:
+        dict: Entity type to float32 embeddings in the order of its names, None for no names
+        dict: Names encoded, duplicates skipped, processes, seconds and names per second
+    """
+    start_time = time.time()
+    processes = processes if processes is not None else EMBEDDING['encode_processes']
+    processes = processes or os.cpu_count() or 1
+    batch_size = batch_size or EMBEDDING['encode_batch_size']
+
+    total = sum(len(names) for names in vocabularies.values())
+    unique = list(dict.fromkeys(name for names in vocabularies.values() for name in names))
+    batches = length_batches(unique, batch_size)
+    if len(unique) < EMBEDDING['encode_parallel_min']:
+        processes = 1
+    processes = max(1, min(processes, len(batches)))
+
+    encoded = [None] * len(batches)
+    done, next_report = 0, 0.1
+    with _batch_encoder(model, model_loader, processes) as encode:
+        for i, embeddings in encode(enumerate(batches)):
+            encoded[i] = embeddings
+            done += len(batches[i])
+            if len(batches) > 1 and done / len(unique) >= next_report:
+                print(f"Encoded {done}/{len(unique)} names ({done / len(unique):.0%})")
+                next_report = done / len(unique) + 0.1
+
+    matrix = np.concatenate([np.asarray(e, dtype=np.float32) for e in encoded]) if encoded else None
+    rows = {name: i for i, name in enumerate(name for batch in batches for name in batch)}
+    embeddings = {
+        entity_type: matrix[[rows[name] for name in names]] if names else None
+        for entity_type, names in vocabularies.items()
+    }
+
+    seconds = time.time() - start_time
+    stats = {
+        'names': len(unique),
+        'duplicates': total - len(unique),
+        'processes': processes,
+        'seconds': round(seconds, 2),
+        'names_per_second': round(len(unique) / seconds) if seconds > 0 else None
+    }
+    print(f"Encoded {len(unique)} names ({stats['duplicates']} duplicates skipped) with {processes} "
+          f"process{'es' if processes > 1 else ''} in {seconds:.2f} seconds: {stats['names_per_second']} names/s")
+    return embeddings, stats
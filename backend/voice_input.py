@@ -4,13 +4,16 @@ Connecting with query processor
 '''
 
 # voice_input.py
+import queue
 import time
 import whisper
 import sounddevice as sd
 import numpy as np
 from scipy.io.wavfile import write
-from query_processor import QueryProcessor
-from data_handler import DataHandler
+from config import STREAMING_VOICE
+from .query_processor import QueryProcessor
+from .data_handler import DataHandler, search_key
+from .speculation import SpeculativeQuery, normalize_transcript, stable_prefix
 import pandas as pd
 
 # Load Whisper model
@@ -51,30 +54,169 @@ def get_voice_input():
     print(f"Total processing time: {total_time:.2f} seconds")
     return text
 
+def stream_voice_input(on_partial, settings=None):
+    """
+    Record until the speaker pauses, transcribing overlapping windows of the
+    audio while they are still speaking.
+
+    Args:
+        on_partial (callable): Called with each new stable partial transcript
+        settings (dict, optional): Overrides for config.STREAMING_VOICE
+
+    Returns:
+        str: Final transcript of the whole utterance
+        float: Wall-clock time speech ended
+        dict: Partial transcription counts and times
+    """
+    settings = {**STREAMING_VOICE, **(settings or {})}
+    fs = settings["sample_rate"]
+    chunks = queue.Queue()
+    audio = np.zeros(0, dtype=np.float32)
+    stats = {'partials': 0, 'stable_partials': 0, 'partial_seconds': 0.0}
+    previous, stable = "", ""
+    speech_started, last_voiced = False, None
+    transcribed = 0
+    start_time = time.time()
+
+    print("listening")
+    with sd.InputStream(samplerate=fs, channels=1, dtype="float32",
+                        callback=lambda data, frames, t, status: chunks.put(data[:, 0].copy())):
+        while True:
+            # Take everything captured so far; transcription may have fallen behind
+            try:
+                new = [chunks.get(timeout=0.1)]
+                while not chunks.empty():
+                    new.append(chunks.get_nowait())
+            except queue.Empty:
+                new = []
+            for chunk in new:
+                audio = np.concatenate([audio, chunk])
+                if np.sqrt(np.mean(chunk ** 2)) >= settings["silence_threshold"]:
+                    speech_started, last_voiced = True, time.time()
+
+            now = time.time()
+            if speech_started and now - last_voiced >= settings["silence_seconds"]:
+                break
+            if now - start_time >= settings["max_seconds"]:
+                last_voiced = last_voiced or now
+                break
+
+            if speech_started and len(audio) - transcribed >= settings["chunk_seconds"] * fs:
+                # Each partial re-transcribes the trailing window, overlapping the previous one
+                partial_start = time.time()
+                window = audio[-int(settings["window_seconds"] * fs):]
+                text = normalize_transcript(model.transcribe(window)["text"])
+                transcribed = len(audio)
+                stats['partials'] += 1
+                stats['partial_seconds'] += time.time() - partial_start
+
+                agreed = stable_prefix(previous, text)
+                if agreed and agreed != stable:
+                    stable = agreed
+                    stats['stable_partials'] += 1
+                    on_partial(stable)
+                previous = text
+
+    end_of_speech = last_voiced or time.time()
+    final_start = time.time()
+    text = model.transcribe(audio)["text"] if len(audio) else ""
+    stats['final_transcription'] = round(time.time() - final_start, 3)
+    stats['partial_seconds'] = round(stats['partial_seconds'], 3)
+    print(f"You said: {text}")
+    return text, end_of_speech, stats
+
 if __name__ == "__main__":
-    from response_generator import ResponseGenerator
+    from .response_generator import ResponseGenerator
+    from .slow_query_log import SlowQueryLog
+    from .session_store import SessionStore
     responder = ResponseGenerator()
+    slow_query_log = SlowQueryLog()
+    # One conversation: follow-ups like "only gold" narrow the previous answer
+    sessions = SessionStore()
+
+    def respond(query, query_params, results, timer, log_entry):
+        """Generate and print the answer for a searched query."""
+        log_entry['result_rows'] = len(results)
+        with timer.stage('generate_response'):
+            response = responder.generate_response(
+                query=query,
+                results=results,
+                entities=query_params['entities'],
+                intent=query_params['intent']
+            )
+        log_entry['prompt_tokens'] = responder.last_stats.get('prompt_tokens')
+        log_entry['generated_tokens'] = responder.last_stats.get('generated_tokens')
+        log_entry['max_new_tokens'] = responder.last_stats.get('max_new_tokens')
+        print("Assistant:", response)
 
     while True:
-        user_input = input("Type 'speak' to speak or 'exit': ").lower()
+        user_input = input("Type 'speak' to speak, 'stream' to speak with streaming transcription, or 'exit': ").lower()
         if user_input == "exit":
             break
         elif user_input == "speak":
             query_start_time = time.time()
-            query = get_voice_input()
-            if query:
-                # Process the query
-                query_params = processor.process_query(query, df=df)
-                results, analysis_info = handler.search_data(query_params)
-
-                # Generate natural language response
-                response = responder.generate_response(
-                    query=query,
-                    results=results,
-                    entities=query_params['entities'],
-                    intent=query_params['intent']
-                )
-
-                total_query_time = time.time() - query_start_time
-                print("Assistant:", response)
-                print(f"Total query processing time: {total_query_time:.2f} seconds")
\ No newline at end of file
+            with slow_query_log.track(None) as log_entry:
+                timer = log_entry['timer']
+                with timer.stage('voice_input'):
+                    query = get_voice_input()
+                log_entry['query'] = query
+                if query:
+                    # Process the query
+                    with timer.stage('process_query'):
+                        query_params = processor.process_query(query, df=df)
+                    timer.add(query_params['timings'])
+                    log_entry['query_params'] = {k: v for k, v in query_params.items() if k != 'timings'}
+                    with timer.stage('search_data'):
+                        query_params, results, analysis_info = sessions.search(
+                            "voice", query_params, handler, processor.is_follow_up(query)
+                        )
+
+                    # Generate natural language response
+                    respond(query, query_params, results, timer, log_entry)
+                    total_query_time = time.time() - query_start_time
+                    print(f"Total query processing time: {total_query_time:.2f} seconds")
+        elif user_input == "stream":
+            with slow_query_log.track(None) as log_entry:
+                timer = log_entry['timer']
+                # Match entities and filter on stable partial transcripts while the user speaks
+                speculation = SpeculativeQuery(processor, handler, lambda text, params: sessions.resolve(
+                    "voice", params, processor.is_follow_up(text), preview=True
+                ))
+                with timer.stage('voice_input'):
+                    query, end_of_speech, voice_stats = stream_voice_input(speculation.submit)
+                log_entry['query'] = query
+                if query:
+                    hit = speculation.finish()
+                    reused, saved = [], 0.0
+                    with timer.stage('process_query'):
+                        if hit and hit['text'] == normalize_transcript(query):
+                            query_params = hit['query_params']
+                            reused.append('process_query')
+                            saved += hit['process_seconds']
+                        else:
+                            query_params = processor.process_query(query)
+                    timer.add(query_params['timings'])
+                    log_entry['query_params'] = {k: v for k, v in query_params.items() if k != 'timings'}
+
+                    # Reuse the speculative results when the final transcript resolves to the same search
+                    with timer.stage('search_data'):
+                        query_params = sessions.resolve("voice", query_params, processor.is_follow_up(query))
+                        if hit and hit['key'] == search_key(query_params):
+                            results = hit['results']
+                            reused.append('search_data')
+                            saved += hit['search_seconds']
+                        else:
+                            results, analysis_info = handler.search_data(query_params)
+                        sessions.save("voice", query_params, handler.row_positions(results))
+
+                    respond(query, query_params, results, timer, log_entry)
+                    latency = time.time() - end_of_speech
+                    log_entry['speculation'] = {
+                        **voice_stats,
+                        'speculative_runs': speculation.runs,
+                        'reused': reused,
+                        'saved_seconds': round(saved, 3),
+                        'end_of_speech_to_answer': round(latency, 3)
+                    }
+                    print(f"End of speech to answer: {latency:.2f} seconds, "
+                          f"speculation saved {saved:.2f} seconds ({', '.join(reused) or 'nothing reused'})")
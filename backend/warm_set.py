@@ -0,0 +1,296 @@
+"""
+Query log mining and the warm set of precomputed answers.
+
+The server appends every query, normalized, with its resolved filters to an
+append-only log. This job mines the most frequent searches for a dataset
+version, runs them and generates their answers, and writes them to the warm
+set the server loads at startup and whenever the active dataset changes:
+
+    python -m backend.warm_set data/olympic.csv
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from config import LLM, WARM_SET
+from .data_handler import search_key
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def normalize_query(query):
+    """Lowercase a query and drop punctuation and extra whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+def warm_key(query_params):
+    """Key of the search a query resolves to, whether or not it was a follow-up."""
+    return search_key({**query_params, 'follow_up': False})
+
+
+class QueryLog:
+    def __init__(self, path=None):
+        """
+        Append-only log of normalized queries and the filters they resolved to.
+
+        Args:
+            path (str, optional): JSON lines file, defaults to WARM_SET['query_log_path']
+        """
+        self.path = path or WARM_SET["query_log_path"]
+        self._lock = threading.Lock()
+
+    def append(self, query, query_params, dataset=None):
+        """
+        Record a query.
+
+        Args:
+            query (str): Query as asked
+            query_params (dict): Resolved parameters the query was searched with
+            dataset (str, optional): Version of the dataset it ran against
+        """
+        record = {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'dataset': dataset,
+            'query': normalize_query(query),
+            'key': warm_key(query_params),
+            'intent': query_params.get('intent'),
+            'filters': query_params.get('filters', {}),
+            'entities': query_params.get('entities', {})
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock, open(self.path, "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def mine(self, dataset, top_n=None, min_count=None):
+        """
+        Find the most frequent searches against a dataset version.
+
+        Args:
+            dataset (str): Dataset version
+            top_n (int, optional): Searches returned, defaults to WARM_SET['top_n']
+            min_count (int, optional): Minimum occurrences, defaults to WARM_SET['min_count']
+
+        Returns:
+            list: Searches by descending count, each with its key, count, most common
+                phrasing, intent, filters and entities
+        """
+        top_n = top_n or WARM_SET["top_n"]
+        min_count = min_count or WARM_SET["min_count"]
+        counts = Counter()
+        phrasings = defaultdict(Counter)
+        latest = {}
+        if os.path.isfile(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['dataset'] != dataset:
+                        continue
+                    counts[record['key']] += 1
+                    phrasings[record['key']][record['query']] += 1
+                    latest[record['key']] = record
+
+        return [
+            {
+                'key': key, 'count': count, 'query': phrasings[key].most_common(1)[0][0],
+                'intent': latest[key]['intent'], 'filters': latest[key]['filters'], 'entities': latest[key]['entities']
+            }
+            for key, count in counts.most_common(top_n) if count >= min_count
+        ]
+
+
+def llm_id(settings=None):
+    """Identify the model answers are generated with, so warm sets from another model are ignored."""
+    settings = {**LLM, **(settings or {})}
+    return f"{settings['runtime']}:{settings['model_file']}"
+
+
+class WarmSet:
+    def __init__(self, directory=None, llm=None):
+        """
+        Serving cache of precomputed answers to the most frequent searches.
+
+        Args:
+            directory (str, optional): Where warm sets are stored, defaults to WARM_SET['dir']
+            llm (str, optional): Model the served answers must come from, see llm_id
+        """
+        self.directory = directory or WARM_SET["dir"]
+        self.llm = llm or llm_id()
+        self.version = None
+        self.entries = {}
+        # Modification time of the loaded warm set file
+        self.mtime = None
+        self.counters = {'lookups': 0, 'hits': 0}
+        self._lock = threading.Lock()
+
+    def path_for(self, version):
+        return os.path.join(self.directory, f"{version}.json")
+
+    def refresh(self, version):
+        """
+        Load the warm set of a dataset version if it changed since the last call.
+
+        Args:
+            version (str or None): Version of the active dataset
+
+        Returns:
+            bool: Whether a warm set exists for the version
+        """
+        path = self.path_for(version) if version else None
+        mtime = os.path.getmtime(path) if path and os.path.isfile(path) else None
+        if version == self.version and mtime == self.mtime:
+            return mtime is not None
+
+        entries = {}
+        if mtime is not None:
+            with open(path) as f:
+                warm = json.load(f)
+            if warm['llm'] == self.llm:
+                rows = np.load(path[:-len(".json")] + ".npz")
+                for i, entry in enumerate(warm['entries']):
+                    entries[entry['key']] = {**entry, 'row_ids': rows[f"e{i}"]}
+                print(f"Loaded {len(entries)} warm answers for dataset {version}")
+        with self._lock:
+            self.version, self.mtime, self.entries = version, mtime, entries
+        return mtime is not None
+
+    def lookup(self, query_params):
+        """
+        Return the precomputed answer for a query's search, counting the lookup.
+
+        Args:
+            query_params (dict): Resolved query parameters
+
+        Returns:
+            dict or None: Entry with 'response' and 'row_ids', or None on a miss
+        """
+        with self._lock:
+            self.counters['lookups'] += 1
+            # Follow-ups narrowed to a previous turn's rows are not standalone searches
+            if query_params.get('row_ids') is not None:
+                return None
+            entry = self.entries.get(warm_key(query_params))
+            if entry is not None:
+                self.counters['hits'] += 1
+            return entry
+
+    def stats(self):
+        """Report the warm set size and the share of lookups it served."""
+        with self._lock:
+            lookups, hits = self.counters['lookups'], self.counters['hits']
+            return {
+                'version': self.version,
+                'entries': len(self.entries),
+                'lookups': lookups,
+                'hits': hits,
+                'warm_share': round(hits / lookups, 4) if lookups else None
+            }
+
+
+def build_warm_set(searches, data_handler, response_generator, version, directory=None, llm=None):
+    """
+    Run the mined searches, generate their answers and write the warm set.
+
+    Args:
+        searches (list): Output of QueryLog.mine
+        data_handler (DataHandler): Handler for the dataset version
+        response_generator (ResponseGenerator): Generates the answers
+        version (str): Dataset version
+        directory (str, optional): Defaults to WARM_SET['dir']
+        llm (str, optional): Model id stored with the answers, see llm_id
+
+    Returns:
+        str: Path of the written warm set
+    """
+    directory = directory or WARM_SET["dir"]
+    os.makedirs(directory, exist_ok=True)
+    entries, rows = [], {}
+    for i, search in enumerate(searches):
+        start_time = time.time()
+        query_params = {'intent': search['intent'], 'filters': search['filters'], 'entities': search['entities']}
+        results, _ = data_handler.search_data(query_params)
+        response = response_generator.generate_response(search['query'], results, search['entities'], search['intent'])
+        rows[f"e{i}"] = data_handler.row_positions(results)
+        entries.append({
+            'key': search['key'], 'count': search['count'], 'query': search['query'],
+            'intent': search['intent'], 'entities': search['entities'], 'response': response,
+            'seconds': round(time.time() - start_time, 3)
+        })
+
+    # Rows first, so a reader that sees the new JSON also finds its rows
+    path = os.path.join(directory, f"{version}.json")
+    np.savez(os.path.join(directory, f"{version}.tmp.npz"), **rows)
+    os.replace(os.path.join(directory, f"{version}.tmp.npz"), path[:-len(".json")] + ".npz")
+    with open(path + ".tmp", "w") as f:
+        json.dump({'version': version, 'llm': llm or llm_id(), 'built_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   'entries': entries}, f, default=str)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def start_rebuild(csv_path):
+    """
+    Run this module as a background process for a dataset.
+
+    The job runs in the server's working directory, so relative paths in config.py
+    resolve the same way, with the repository root on its path wherever that is.
+
+    Returns:
+        Popen: The process; the caller polls it so it is reaped once it exits
+    """
+    import subprocess
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")]))
+    return subprocess.Popen([sys.executable, "-m", "backend.warm_set", os.path.abspath(csv_path)],
+                            cwd=os.getcwd(), env={**os.environ, "PYTHONPATH": python_path})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine the query log and precompute answers to the most frequent searches")
+    parser.add_argument("csv_path", help="Dataset CSV file")
+    parser.add_argument("--top", type=int, default=WARM_SET["top_n"])
+    parser.add_argument("--min-count", type=int, default=WARM_SET["min_count"])
+    args = parser.parse_args()
+
+    from .data_handler import DataHandler
+    from .llm_utils import LocalLLM
+    from .response_generator import ResponseGenerator, SYSTEM_PROMPT
+    from .shared_entities import dataset_key
+
+    version = dataset_key(args.csv_path)
+    os.makedirs(WARM_SET["dir"], exist_ok=True)
+    with open(os.path.join(WARM_SET["dir"], f"{version}.lock"), "w") as lock:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"A warm set build for {version} is already running")
+                return
+
+        start_time = time.time()
+        searches = QueryLog().mine(version, top_n=args.top, min_count=args.min_count)
+        print(f"Mined {len(searches)} frequent searches for dataset {version}")
+        if not searches:
+            # Nothing to generate, so the model is not loaded next to the server's copy
+            return
+        # Stub-model servers (STAT_AGENT_STUB_MODELS) get answers from the stub runtime
+        runtime = "stub" if os.environ.get("STAT_AGENT_STUB_MODELS") else None
+        llm = LocalLLM(runtime=runtime, prompt_prefix=SYSTEM_PROMPT)
+        path = build_warm_set(
+            searches, DataHandler(csv_path=args.csv_path), ResponseGenerator(llm=llm), version,
+            llm=llm_id(llm.settings)
+        )
+        print(f"Warm set written to {path} in {time.time() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,44 @@ SPEECH_RECOGNITION = {
 # Vector embedding settings
 EMBEDDING = {
     "model_name": "all-MiniLM-L6-v2",  # Sentence transformer model
-    "cache_dir": "./.cache/embeddings"  # Cache directory for models
+    "cache_dir": "./.cache/embeddings", # Cache directory for models
+    "dtype": "float16",                 # Entity embedding storage: float32, float16 or int8
+    "rescore_top_k": 16,                # Candidates rescored exactly after the compact search
+    "compact_frame": True,              # Store entity columns as categoricals; names stay duplicated in the entity stores
+    "encode_processes": 2,              # Processes encoding cold vocabularies, 0 for one per CPU; each
+                                        # loads its own model copy (~100 MB RSS for MiniLM) while encoding
+    "encode_batch_size": 128,           # Names per encode batch, grouped by length to limit padding
+    "encode_parallel_min": 20000        # Fewer distinct names are encoded in-process
+}
+
+# Local LLM settings
+LLM = {
+    "runtime": "ctransformers",         # ctransformers, llama_cpp or stub
+    "model_folder": "models",
+    "model_file": "mistral-7b-instruct-v0.2.Q4_K_M.gguf",
+    "model_type": "mistral",
+    "context_length": 2048,
+    "max_new_tokens": 256,
+    "temperature": 0.7,
+    "threads": -1,                      # CPU threads, -1 lets the runtime decide
+    "batch_size": 8,                    # Tokens evaluated per batch during prompt evaluation
+    "mmap": True,                       # Memory-map the model file
+    "mlock": False,                     # Lock the model in RAM
+    "tuning_path": "./.cache/llm_tuning.json"  # Threads/batch size saved by backend.llm_autotune
+}
+
+# Answer generation budgets (ResponseGenerator), by query intent
+GENERATION = {
+    "intents": {
+        "medal_count": {"max_new_tokens": 48, "length_hint": "one sentence", "stop": ["\n\n"]},
+        "filter": {"max_new_tokens": 96, "length_hint": "one to three sentences", "stop": ["\n\n"]},
+        "ranking": {"max_new_tokens": 160, "length_hint": "a short ranked list"},
+        "analysis": {"max_new_tokens": 256, "length_hint": "a short paragraph"}
+    },
+    "default": {"max_new_tokens": 128},
+    # The model starting another turn of the prompt template ends the answer
+    "stop": ["\nUser Question:", "\nQuestion:", "\nContext:", "\nIntent:", "[INST]", "</s>"],
+    "length_hints": True                # Tell the model how long the answer should be
 }
 
 # Search settings
@@ -25,7 +62,9 @@ SEARCH = {
     "query_match_threshold": 0.65,      # Minimum similarity score for query matches
     "top_k_results": 10,                # Maximum number of results to return
     "fallback_to_fuzzy": True,          # Use fuzzy matching as fallback
-    "fuzzy_match_ratio": 75             # Minimum ratio (0-100) for fuzzy matching
+    "fuzzy_match_ratio": 75,            # Minimum ratio (0-100) for fuzzy matching
+    "page_size": 50,                    # Rows per page of formatted results
+    "export_chunksize": 10000           # Rows serialized per chunk in streaming exports
 }
 
 # UI settings
@@ -39,6 +78,79 @@ UI = {
     "max_displayed_results": 20         # Maximum number of rows to display
 }
 
+# Slow-query log settings
+SLOW_QUERY_LOG = {
+    "enabled": True,
+    "threshold_seconds": 10.0,          # Requests slower than this are logged
+    "log_path": "./logs/slow_queries.jsonl",
+    "profile_sample_rate": 0.0,         # Fraction of requests run under the sampling profiler
+    "profile_header": "X-Profile",      # Requests with this header set are always profiled
+    "profile_interval_ms": 5,           # Milliseconds between stack samples
+    "profile_dir": "./logs/profiles"    # Folded-stack profiles of slow requests are written here
+}
+
+# Load test settings (testing/loadgen.py, server started with STAT_AGENT_STUB_MODELS=1)
+LOAD_TEST = {
+    "stub_embed_latency_ms": 5,         # Simulated latency per embedding call
+    "stub_llm_latency_ms": 200,         # Simulated prompt evaluation latency per LLM call
+    "stub_token_latency_ms": 20,        # Simulated latency per generated token
+    "corpus_path": "testing/query_corpus.txt"
+}
+
 # Advanced settings
 DEBUG = False                          # Enable debug output
-CACHE_EMBEDDINGS = True                # Cache vector embeddings between runs
\ No newline at end of file
+CACHE_EMBEDDINGS = True                # Cache vector embeddings between runs
+
+# Dataset residency settings
+RESIDENCY = {
+    "memory_budget_mb": 2048,           # Memory budget for resident datasets
+    "spill_dir": "./.cache/datasets"    # Where evicted datasets are written for reloading
+}
+
+# Embedded SQL engine settings (DataHandler engine="sqlite")
+SQL_ENGINE = {
+    "db_path": "./.cache/olympic.sqlite",   # SQLite database holding the dataset
+    "chunksize": 50000                      # Rows per chunk when ingesting and streaming results
+}
+
+# Column statistics used to plan searches (DataHandler.statistics)
+STATISTICS = {
+    "most_common_values": 64,           # Most frequent values kept with exact counts per column
+    "distinct_sample": 1000             # Other distinct values sampled to estimate substring matches
+}
+
+# Conversational sessions (follow-up queries narrowing the previous results)
+SESSIONS = {
+    "max_sessions": 1000,               # Least recently used sessions beyond this are dropped
+    "idle_seconds": 900,                # Sessions idle for longer expire
+    "row_id_budget": 5000000            # Row ids retained across all sessions (8 bytes each)
+}
+
+# Entity state shared by server workers through memory-mapped files
+SHARED_ENTITIES = {
+    "enabled": True,
+    "cache_dir": "./.cache/entities",   # Published vocabularies and embeddings, one directory per dataset
+    "lock_timeout_seconds": 600,        # How long a worker waits for another worker's build
+    "preload_data_path": None           # Dataset attached before a worker reports ready (or STAT_AGENT_DATA_PATH)
+}
+
+# Streaming voice input (python -m backend.voice_input, "stream" mode)
+STREAMING_VOICE = {
+    "sample_rate": 16000,               # Whisper's native rate, no resampling needed
+    "chunk_seconds": 0.5,               # New audio between partial transcriptions
+    "window_seconds": 30,               # Trailing audio re-transcribed for each partial
+    "max_seconds": 15,                  # Longest utterance recorded
+    "silence_threshold": 0.01,          # RMS below which a chunk counts as silence
+    "silence_seconds": 0.8              # Trailing silence that ends the utterance
+}
+
+# Query log and warm set of precomputed answers to the most frequent searches
+WARM_SET = {
+    "enabled": True,
+    "query_log_path": "./logs/query_log.jsonl",     # Append-only log of normalized queries and resolved filters
+    "dir": "./.cache/warm_set",                     # Precomputed answers, one file per dataset version
+    "top_n": 200,                                   # Most frequent searches precomputed
+    "min_count": 3,                                 # Searches seen fewer times are not precomputed
+    "rebuild_on_load": True,                        # Start the mining job when a dataset's warm set is missing or old
+    "rebuild_interval_seconds": 3600                # Age after which the warm set is rebuilt from the grown log
+}
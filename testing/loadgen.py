@@ -0,0 +1,238 @@
+"""
+Load generator for the FastAPI service in backend/main.py.
+
+Drives an endpoint with a query mix from a corpus, either closed-loop (each of
+--concurrency workers sends its next request as soon as the previous one
+returns) or open-loop (--rate requests per second arrive on a Poisson schedule
+and queue for the workers). Reports latency percentiles, throughput, error rate
+and queue depth over time, and writes a JSON summary for comparing builds.
+
+Example, against a server started with stub models and 4 workers:
+
+    python testing/loadgen.py --start-server --workers 4 --data-path data/olympic.csv \\
+        --concurrency 16 --duration 60 --output loadtest.json
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from config import LOAD_TEST
+
+
+def load_corpus(path):
+    """Read one query per line, skipping blanks and comments."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[idx]
+
+
+class LoadGenerator:
+    def __init__(self, url, endpoint, corpus, concurrency, duration, rate=None, data_path=None, timeout=120, seed=0):
+        self.url = url.rstrip("/") + endpoint
+        self.corpus = corpus
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.data_path = data_path
+        self.timeout = timeout
+        self.random = random.Random(seed)
+
+        self.results = []           # (finish time, latency, ok, status, answered from the warm set)
+        self.timeline = []          # per-second samples of in-flight and queued requests
+        self.in_flight = 0
+        self.arrivals = queue.Queue()
+        self.lock = threading.Lock()
+        self.stop_at = None
+
+    def _send(self, query):
+        body = {"query": query}
+        if self.data_path:
+            body["data_path"] = self.data_path
+        request = urllib.request.Request(
+            self.url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"}
+        )
+        start_time = time.time()
+        body = b""
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 0
+        warm_hit = body.startswith(b"{") and bool(json.loads(body).get("warm_hit", False))
+        return time.time() - start_time, status, warm_hit
+
+    def _worker(self):
+        while time.time() < self.stop_at:
+            if self.rate:
+                # Latency counts from the scheduled arrival, so time spent queued is included
+                try:
+                    arrival_time, query = self.arrivals.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            else:
+                arrival_time = time.time()
+                with self.lock:
+                    query = self.random.choice(self.corpus)
+
+            with self.lock:
+                self.in_flight += 1
+            _, status, warm_hit = self._send(query)
+            with self.lock:
+                self.in_flight -= 1
+                self.results.append((time.time(), time.time() - arrival_time, 200 <= status < 300, status, warm_hit))
+
+    def _arrivals(self):
+        """Enqueue requests on a Poisson schedule at the target rate (open loop)."""
+        next_time = time.time()
+        while next_time < self.stop_at:
+            time.sleep(max(0.0, next_time - time.time()))
+            self.arrivals.put((next_time, self.random.choice(self.corpus)))
+            next_time += self.random.expovariate(self.rate)
+
+    def _sample(self, start_time):
+        while time.time() < self.stop_at:
+            time.sleep(1.0)
+            with self.lock:
+                self.timeline.append({
+                    't': round(time.time() - start_time, 1),
+                    'in_flight': self.in_flight,
+                    'queued': self.arrivals.qsize(),
+                    'completed': len(self.results)
+                })
+
+    def run(self):
+        start_time = time.time()
+        self.stop_at = start_time + self.duration
+        threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.concurrency)]
+        threads.append(threading.Thread(target=self._sample, args=(start_time,), daemon=True))
+        if self.rate:
+            threads.append(threading.Thread(target=self._arrivals, daemon=True))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.summary(time.time() - start_time, start_time)
+
+    def summary(self, elapsed, start_time):
+        latencies = [r[1] for r in self.results]
+        errors = [r for r in self.results if not r[2]]
+
+        # Per-second throughput and p95 latency alongside the queue samples
+        for sample in self.timeline:
+            window = [r for r in self.results if sample['t'] - 1 <= r[0] - start_time < sample['t']]
+            sample['throughput'] = len(window)
+            sample['p95_ms'] = round(percentile([r[1] for r in window], 95) * 1000, 1) if window else None
+
+        return {
+            'url': self.url,
+            'mode': 'open' if self.rate else 'closed',
+            'concurrency': self.concurrency,
+            'target_rate': self.rate,
+            'duration_seconds': round(elapsed, 2),
+            'requests': len(self.results),
+            'throughput_rps': round(len(self.results) / elapsed, 2) if elapsed else 0,
+            'error_rate': round(len(errors) / len(self.results), 4) if self.results else None,
+            'status_counts': {str(s): sum(1 for r in self.results if r[3] == s) for s in {r[3] for r in self.results}},
+            'latency_ms': {
+                name: round(percentile(latencies, pct) * 1000, 1) if latencies else None
+                for name, pct in (('p50', 50), ('p95', 95), ('p99', 99))
+            },
+            'warm_share': round(sum(1 for r in self.results if r[4]) / len(self.results), 4) if self.results else None,
+            'max_queued': max((s['queued'] for s in self.timeline), default=0),
+            'unsent': self.arrivals.qsize(),
+            'timeline': self.timeline
+        }
+
+
+def start_server(port, workers, embed_ms, llm_ms, token_ms, data_path=None):
+    """Start uvicorn with stub models and wait until it answers /ready."""
+    env = dict(os.environ, STAT_AGENT_STUB_MODELS="1", STAT_AGENT_STUB_EMBED_MS=str(embed_ms),
+               STAT_AGENT_STUB_LLM_MS=str(llm_ms), STAT_AGENT_STUB_TOKEN_MS=str(token_ms))
+    if data_path:
+        # Workers attach the dataset's shared entity state before reporting ready
+        env["STAT_AGENT_DATA_PATH"] = data_path
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--workers", str(workers)],
+        cwd=os.path.join(os.path.dirname(__file__), ".."), env=env
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1):
+                return server
+        except Exception:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("Server did not become ready within 120 seconds")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Olympic data assistant API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/query")
+    parser.add_argument("--corpus", default=LOAD_TEST["corpus_path"])
+    parser.add_argument("--data-path", help="data_path sent with every request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/s (default: closed loop)")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON summary to this file")
+    parser.add_argument("--start-server", action="store_true", help="Start uvicorn with stub models")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--embed-ms", type=float, default=LOAD_TEST["stub_embed_latency_ms"])
+    parser.add_argument("--llm-ms", type=float, default=LOAD_TEST["stub_llm_latency_ms"])
+    parser.add_argument("--token-ms", type=float, default=LOAD_TEST["stub_token_latency_ms"])
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        server = start_server(args.port, args.workers, args.embed_ms, args.llm_ms, args.token_ms, args.data_path)
+        args.url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        generator = LoadGenerator(
+            args.url, args.endpoint, load_corpus(args.corpus), args.concurrency, args.duration,
+            rate=args.rate, data_path=args.data_path, seed=args.seed
+        )
+        summary = generator.run()
+        summary['server_workers'] = args.workers if args.start_server else None
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"Requests: {summary['requests']}  Throughput: {summary['throughput_rps']} req/s  "
+          f"Errors: {summary['error_rate']}  Warm share: {summary['warm_share']}")
+    print("Latency ms: " + "  ".join(f"{k}={v}" for k, v in summary['latency_ms'].items()))
+    for sample in summary['timeline']:
+        print(f"  t={sample['t']:>6}s  done/s={sample['throughput']:>4}  in_flight={sample['in_flight']:>3}  "
+              f"queued={sample['queued']:>4}  p95={sample['p95_ms']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Summary written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
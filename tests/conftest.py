@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from backend.entity_store import EntityStore
+
+class FakeProcessor:
+    """Stands in for QueryProcessor without loading the embedding model."""
+    def __init__(self):
+        self.set_entity_state(None)
+
+    def learn_from_data(self, df):
+        names = df['Team'].unique().tolist()
+        self.stores = {'country': EntityStore(names, np.ones((len(names), 384), dtype=np.float32))}
+
+    @staticmethod
+    def entity_columns(df):
+        return {'country': 'Team'}
+
+    def get_entity_state(self):
+        return {'stores': self.stores, 'years': []}
+
+    def set_entity_state(self, state=None):
+        state = state or {}
+        self.stores = state.get('stores', {})
+        self.countries = list(self.stores.get('country', []))
+
+@pytest.fixture
+def fake_processor():
+    return FakeProcessor()
@@ -0,0 +1,55 @@
+import pytest
+import pandas as pd
+from backend.dataset_registry import DatasetRegistry
+
+def make_df(teams):
+    return pd.DataFrame({'Team': teams, 'Year': [2020] * len(teams), 'Gold': range(len(teams))})
+
+@pytest.fixture
+def registry(tmp_path, fake_processor):
+    return DatasetRegistry(fake_processor, memory_budget_mb=1, spill_dir=str(tmp_path))
+
+def test_activate_swaps_entity_state(registry):
+    registry.register('summer', df=make_df(['USA', 'China']))
+    registry.register('winter', df=make_df(['Norway']))
+    registry.activate('summer')
+    assert registry.query_processor.countries == ['China', 'USA']
+    registry.activate('winter')
+    assert registry.query_processor.countries == ['Norway']
+    assert registry.stats()['hits'] == 2
+
+def test_evicts_coldest_over_budget_and_reloads(registry):
+    big = [f"Team {i:04d}" for i in range(1000)]
+    registry.register('summer', df=make_df(big))
+    registry.register('winter', df=make_df(big[::-1]))
+    assert list(registry.resident) == ['winter']
+    assert registry.stats()['evictions'] == 1
+
+    handler = registry.activate('summer')
+    assert handler.df['Team'].tolist() == big
+    assert registry.query_processor.countries == big
+    assert registry.query_processor.stores['country'].embeddings.shape == (1000, 384)
+    assert registry.stats()['reloads'] == 1
+
+def test_only_frames_read_by_the_registry_are_compacted(tmp_path, fake_processor):
+    csv_path = str(tmp_path / "summer.csv")
+    make_df(['USA', 'China']).to_csv(csv_path, index=False)
+    registry = DatasetRegistry(fake_processor, spill_dir=str(tmp_path / "spill"))
+    registry.register("summer", csv_path=csv_path)
+    assert isinstance(registry.resident["summer"]['handler'].df['Team'].dtype, pd.CategoricalDtype)
+
+    df = make_df(['USA', 'Norway'])
+    registry.register("winter", df=df)
+    assert not isinstance(df['Team'].dtype, pd.CategoricalDtype)
+
+def test_budget_covers_sorted_indexes_and_statistics(registry):
+    registry.register('summer', df=make_df(['USA', 'China', 'Norway']))
+    entry = registry.resident['summer']
+    handler = entry['handler']
+    assert set(handler.sorted_indexes) == {'Year', 'Gold'}
+    indexes = sum(values.nbytes + positions.nbytes for values, positions in handler.sorted_indexes.values())
+    assert indexes == 2 * 3 * 16
+    frame = handler.df.memory_usage(deep=True).sum()
+    stores = entry['entity_state']['stores']['country'].nbytes
+    assert entry['bytes'] == handler.nbytes + stores
+    assert entry['bytes'] > frame + indexes + stores
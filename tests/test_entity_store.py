@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from backend.entity_store import EntityStore
+
+def make_embeddings(n, dim=32, seed=0):
+    emb = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+def test_names_round_trip_and_match_category_codes():
+    names = pd.Series(['Zürich', 'Athens', 'Beijing', 'Athens', 'London']).astype('category')
+    store = EntityStore(names.cat.categories)
+    assert list(store) == names.cat.categories.tolist()
+    assert store.index('London') == names.cat.categories.get_loc('London')
+    assert 'Zürich' in store and 'Paris' not in store
+    assert store[-1] == 'Zürich'
+
+def test_unsorted_names_keep_their_embeddings():
+    emb = make_embeddings(3)
+    store = EntityStore(['c', 'a', 'b'], emb, dtype="float32")
+    assert list(store) == ['a', 'b', 'c']
+    assert np.allclose(store.embeddings[0], emb[1])
+
+def test_quantized_search_finds_nearest(tmp_path):
+    emb = make_embeddings(500)
+    names = [f"athlete {i:03d}" for i in range(500)]
+    for dtype in ("float16", "int8"):
+        store = EntityStore(names, emb, dtype=dtype)
+        assert store.nbytes < store.list_nbytes()
+        assert store.top_candidates(emb[123], 5)[0] == "athlete 123"
+
+        store.save(str(tmp_path / dtype))
+        loaded = EntityStore.load(str(tmp_path / dtype), mmap_mode="r")
+        assert list(loaded) == names
+        assert loaded.top_candidates(emb[42], 5)[0] == "athlete 042"
@@ -0,0 +1,72 @@
+import json
+import pandas as pd
+from backend.llm_utils import LocalLLM, load_llm_settings, trim_to_sentence
+from backend.response_generator import ResponseGenerator
+from config import GENERATION
+
+def test_stub_runtime_generates_deterministically():
+    llm = LocalLLM(runtime="stub", settings={'tuning_path': None, 'stub_response_tokens': 5})
+    first = llm.generate_response("How many gold medals did USA win?")
+    assert first == llm.generate_response("How many gold medals did USA win?")
+    assert len(first.split()) == 5
+    assert llm.last_stats['prompt_tokens'] == 7
+    assert llm.prefix_stats['calls'] == 2
+
+def test_prompts_sharing_the_prefix_reuse_its_tokens():
+    prefix = "You are an Olympic data assistant."
+    llm = LocalLLM(runtime="stub", prompt_prefix=prefix, settings={'tuning_path': None})
+    llm.generate_response(prefix + " How many gold medals did USA win?")
+    assert llm.last_stats['reused_tokens'] == 6
+    llm.generate_response(prefix + " Who won in 2008?")
+    assert (llm.last_stats['prompt_tokens'], llm.last_stats['reused_tokens']) == (10, 6)
+    llm.generate_response("Who won in 2008?")
+    assert llm.last_stats['reused_tokens'] == 0
+    assert llm.prefix_stats == {'calls': 3, 'prompt_tokens': 27, 'reused_tokens': 12}
+
+def test_tuned_settings_apply_to_matching_runtime(tmp_path):
+    tuning_path = tmp_path / "tuning.json"
+    tuning_path.write_text(json.dumps({
+        'runtime': 'stub', 'model_file': 'mistral-7b-instruct-v0.2.Q4_K_M.gguf', 'threads': 12, 'batch_size': 128
+    }))
+    settings = load_llm_settings({'runtime': 'stub', 'tuning_path': str(tuning_path)})
+    assert (settings['threads'], settings['batch_size']) == (12, 128)
+
+    settings = load_llm_settings({'runtime': 'ctransformers', 'tuning_path': str(tuning_path)})
+    assert settings['batch_size'] == 8
+
+    settings = load_llm_settings({'runtime': 'stub', 'tuning_path': str(tuning_path), 'threads': 4})
+    assert (settings['threads'], settings['batch_size']) == (4, 128)
+
+def test_generation_honors_budget_and_stop_sequences():
+    llm = LocalLLM(runtime="stub", settings={'tuning_path': None, 'stub_response_tokens': 20})
+    words = llm.generate_response("Who won?", max_new_tokens=8).split()
+    assert len(words) == 8
+    assert llm.last_stats['generated_tokens'] == 8 and llm.last_stats['stop_reason'] == "length"
+
+    assert llm.generate_response("Who won?", stop=[words[3]]).split() == words[:3]
+    assert llm.last_stats['stop_reason'] == "stop" and llm.last_stats['max_new_tokens'] == 256
+
+def test_stop_reason_comes_from_the_runtime():
+    # Ending naturally on the last budgeted token is not running out of budget
+    llm = LocalLLM(runtime="stub", settings={'tuning_path': None, 'stub_response_tokens': 8})
+    assert len(llm.generate_response("Who won?", max_new_tokens=8).split()) == 8
+    assert llm.last_stats['generated_tokens'] == 8 and llm.last_stats['stop_reason'] == "stop"
+
+    # Without a reported reason, a response that used the whole budget counts as cut off
+    llm.backend.generate = lambda prompt, max_new_tokens=None, stop=None: ("USA won. China won", None, None)
+    assert llm.generate_response("Who won?", max_new_tokens=4) == "USA won."
+    assert llm.last_stats['generated_tokens'] == 4 and llm.last_stats['stop_reason'] == "length"
+
+def test_trim_to_sentence():
+    assert trim_to_sentence("USA won 36 gold medals. China won 48 gold") == "USA won 36 gold medals."
+    assert trim_to_sentence("1. USA\n2. China\n3. Gre") == "1. USA\n2. China\n"
+    assert trim_to_sentence("no sentence end") == "no sentence end"
+
+def test_response_generator_uses_intent_budget():
+    generator = ResponseGenerator(llm=LocalLLM(runtime="stub", settings={'tuning_path': None, 'stub_response_tokens': 200}))
+    results = pd.DataFrame({'Team': ['USA'], 'Year': [2008], 'Gold': [36]})
+    generator.generate_response("How many golds did USA win in 2008?", results, {'country': 'USA'}, 'medal_count')
+    assert generator.last_stats['max_new_tokens'] == GENERATION['intents']['medal_count']['max_new_tokens']
+    assert generator.last_stats['generated_tokens'] <= generator.last_stats['max_new_tokens']
+    assert "Answer in one sentence." in generator._build_prompt("q", results, {}, 'medal_count')
+    assert "Answer in" not in generator._build_prompt("q", results, {}, 'unknown')
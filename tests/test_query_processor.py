@@ -41,4 +41,23 @@ def test_process_query(query_processor):
 def test_semantic_matching(query_processor):
     query = "United States"
     result = query_processor._semantic_match(query, query_processor.countries)
-    assert result == 'USA' 
\ No newline at end of file
+    assert result == 'USA' 
+
+
+def test_extract_numeric_ranges(query_processor):
+    ranges = query_processor.extract_numeric_ranges("gold medals between 2000 and 2012 for athletes under 20")
+    assert ranges == {'year': [('>=', 2000.0), ('<=', 2012.0)], 'age': [('<', 20.0)]}
+    assert query_processor.extract_numeric_ranges("countries with over 30 gold medals") == {}
+    assert query_processor.extract_numeric_ranges("athletes with over 5 medals") == {}
+    assert query_processor.extract_numeric_ranges("How many athletes were over 2 meters") == {}
+    assert query_processor.extract_numeric_ranges("athletes over 30 who won gold") == {'age': [('>', 30.0)]}
+
+def test_is_follow_up(query_processor):
+    assert query_processor.is_follow_up("only swimming")
+    assert query_processor.is_follow_up("Of those, just gold")
+    assert not query_processor.is_follow_up("How many gold medals did USA win in 2020?")
+    assert not query_processor.is_follow_up("Now show me USA medals in 2008")
+    assert not query_processor.is_follow_up("Then who won the most")
+    assert not query_processor.is_follow_up("Also, list the top 10 countries")
+    assert not query_processor.is_follow_up("And how many did China win?")
+    assert not query_processor.is_follow_up("But what about the athletes?")
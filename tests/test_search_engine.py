@@ -0,0 +1,47 @@
+import json
+import sys
+import pandas as pd
+from fastapi.testclient import TestClient
+from backend import main
+from backend.search_engine import missing_export_dependency, paginate, stream_results
+
+def make_results():
+    return pd.DataFrame({'Team': ['USA'] * 7, 'Gold': range(7)}, index=[2, 5, 9, 11, 12, 20, 31])
+
+def test_keyset_pages_cover_all_rows():
+    results = make_results()
+    page = paginate(results, page_size=3)
+    assert page['total'] == 7
+    assert page['rows'].index.tolist() == [2, 5, 9]
+    assert page['next_cursor'] == 9
+
+    page = paginate(results, page_size=3, cursor=page['next_cursor'])
+    assert page['rows'].index.tolist() == [11, 12, 20]
+
+    page = paginate(results, page_size=3, cursor=page['next_cursor'])
+    assert page['rows'].index.tolist() == [31]
+    assert page['next_cursor'] is None and page['next_offset'] is None
+
+def test_ranked_results_page_by_offset():
+    results = make_results().sort_values('Gold', ascending=False)
+    page = paginate(results, page_size=4)
+    assert page['next_cursor'] is None
+    assert page['next_offset'] == 4
+    page = paginate(results, page_size=4, offset=page['next_offset'])
+    assert page['rows']['Gold'].tolist() == [2, 1, 0]
+
+def test_ndjson_stream():
+    results = make_results()
+    chunks = [results.iloc[:4], results.iloc[4:]]
+    lines = b''.join(stream_results(chunks)).decode().splitlines()
+    assert len(lines) == 7
+    assert json.loads(lines[-1]) == {'Team': 'USA', 'Gold': 6}
+
+def test_arrow_export_without_pyarrow_is_rejected_up_front(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    assert missing_export_dependency('arrow') == 'pyarrow'
+    assert missing_export_dependency('ndjson') is None
+
+    response = TestClient(main.app).post('/export', json={'query': 'USA gold', 'format': 'arrow'})
+    assert response.status_code == 501
+    assert response.json()['detail'] == "arrow export requires pyarrow to be installed"
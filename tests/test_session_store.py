@@ -0,0 +1,66 @@
+import time
+import pytest
+import pandas as pd
+from backend.data_handler import DataHandler
+from backend.session_store import SessionStore, merge_filters
+
+@pytest.fixture
+def sample_data():
+    return pd.DataFrame({
+        'Name': ['Michael Phelps', 'Usain Bolt', 'Simone Biles', 'Liu Xiang', 'Katie Ledecky', 'Ryan Lochte'],
+        'Team': ['USA', 'Jamaica', 'USA', 'China', 'USA', 'USA'],
+        'Year': [2008, 2012, 2016, 2008, 2020, 2008],
+        'City': ['Beijing', 'London', 'Rio', 'Beijing', 'Tokyo', 'Beijing'],
+        'Gold': [8, 3, 4, 1, 2, 2],
+        'Silver': [0, 0, 0, 0, 1, 1]
+    })
+
+def make_params(filters):
+    return {'intent': 'filter', 'filters': filters, 'entities': dict(filters)}
+
+def test_merge_filters():
+    merged, narrowing = merge_filters({'country': 'USA', 'year': '2008'}, {'medal_type': 'silver'})
+    assert merged == {'country': 'USA', 'year': '2008', 'medal_type': 'silver'}
+    assert narrowing
+    merged, narrowing = merge_filters({'country': 'USA', 'year': '2008'}, {'year': '2012'})
+    assert merged['year'] == '2012' and not narrowing
+
+@pytest.mark.parametrize("engine", ["pandas", "sqlite"])
+def test_follow_up_narrows_previous_rows(sample_data, tmp_path, engine):
+    handler = DataHandler(df=sample_data, engine=engine, db_path=str(tmp_path / "data.sqlite"))
+    sessions = SessionStore()
+
+    _, results, _ = sessions.search("s1", make_params({'country': 'USA', 'year': '2008'}), handler, follow_up=False)
+    assert list(results.index) == [0, 5]
+
+    params, results, _ = sessions.search("s1", make_params({'medal_type': 'silver'}), handler, follow_up=True)
+    assert params['follow_up'] and list(params['row_ids']) == [0, 5]
+    assert params['filters'] == {'country': 'USA', 'year': '2008', 'medal_type': 'silver'}
+    assert list(results.index) == [5]
+
+    # Replacing a filter runs as a fresh query against the whole dataset
+    params, results, _ = sessions.search("s1", make_params({'year': '2020'}), handler, follow_up=True)
+    assert not params['follow_up'] and 'row_ids' not in params
+    assert params['filters'] == {'year': '2020'}
+    assert list(results.index) == [4]
+
+def test_sessions_expire_and_respect_budget(sample_data):
+    handler = DataHandler(df=sample_data)
+    sessions = SessionStore(idle_seconds=0.05, row_id_budget=5)
+    sessions.search("a", make_params({'country': 'USA'}), handler, follow_up=False)
+    sessions.search("b", make_params({'city': 'beijing'}), handler, follow_up=False)
+    assert sessions.stats()['sessions'] == 1 and sessions.stats()['evicted'] == 1
+
+    time.sleep(0.1)
+    params, _, _ = sessions.search("b", make_params({'medal_type': 'silver'}), handler, follow_up=True)
+    assert not params['follow_up']
+    assert sessions.stats()['expired'] == 1
+
+def test_preview_resolve_leaves_session_untouched(sample_data):
+    handler = DataHandler(df=sample_data)
+    sessions = SessionStore()
+    sessions.search("s1", make_params({'country': 'USA'}), handler, follow_up=False)
+    params = make_params({'medal_type': 'silver'})
+    preview = sessions.resolve("s1", params, follow_up=True, preview=True)
+    assert preview['filters'] == {'country': 'USA', 'medal_type': 'silver'}
+    assert 'follow_up' not in params and sessions.stats()['follow_ups'] == 0
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+from backend.dataset_registry import DatasetRegistry
+from backend.entity_store import EntityStore
+from backend.shared_entities import SharedEntityCache, dataset_key
+
+def make_state():
+    names = ['USA', 'China', 'Norway']
+    return {'stores': {'country': EntityStore(names, np.eye(3, 384, dtype=np.float32))}, 'years': [2020]}
+
+def build_in_worker(cache_dir, key, marker_dir):
+    def build():
+        open(os.path.join(marker_dir, f"built_{os.getpid()}"), "w").close()
+        time.sleep(0.3)
+        return make_state()
+    state = SharedEntityCache(cache_dir=cache_dir).load_or_build(key, build)
+    assert isinstance(state['stores']['country'].embeddings, np.memmap)
+
+def test_state_is_built_once_and_mapped(tmp_path):
+    cache = SharedEntityCache(cache_dir=str(tmp_path))
+    state = cache.load_or_build("k", make_state)
+    store = state['stores']['country']
+    assert store.mapped and list(store) == ['China', 'Norway', 'USA']
+    assert state['years'] == [2020]
+
+    calls = []
+    SharedEntityCache(cache_dir=str(tmp_path)).load_or_build("k", lambda: calls.append(1))
+    assert calls == []
+    assert cache.stats()['attached']['k']['built']
+
+def test_concurrent_workers_build_once(tmp_path):
+    cache_dir, marker_dir = str(tmp_path / "cache"), str(tmp_path / "markers")
+    os.makedirs(marker_dir)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=build_in_worker, args=(cache_dir, "k", marker_dir)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert len(os.listdir(marker_dir)) == 1
+
+def test_registry_maps_shared_state(tmp_path, fake_processor):
+    csv_path = str(tmp_path / "summer.csv")
+    pd.DataFrame({'Team': ['USA', 'China'], 'Year': [2020, 2020], 'Gold': [39, 38]}).to_csv(csv_path, index=False)
+    processor = fake_processor
+    cache = SharedEntityCache(cache_dir=str(tmp_path / "cache"))
+    registry = DatasetRegistry(processor, spill_dir=str(tmp_path / "spill"), shared_cache=cache)
+
+    registry.register(csv_path, csv_path=csv_path)
+    assert processor.countries == ['China', 'USA']
+    assert processor.stores['country'].mapped
+    assert cache.is_published(dataset_key(csv_path))
+    # Mapped stores are shared between workers, so only the handler counts against the budget
+    assert registry.resident[csv_path]['bytes'] == registry.resident[csv_path]['handler'].nbytes
@@ -0,0 +1,41 @@
+import json
+import time
+from backend.slow_query_log import SlowQueryLog
+
+def busy_wait(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+def make_log(tmp_path, **settings):
+    return SlowQueryLog({
+        'log_path': str(tmp_path / 'slow.jsonl'),
+        'profile_dir': str(tmp_path / 'profiles'),
+        'profile_interval_ms': 1,
+        **settings
+    })
+
+def test_only_slow_queries_are_logged(tmp_path):
+    log = make_log(tmp_path, threshold_seconds=0.05)
+    with log.track("fast query"):
+        pass
+    with log.track("slow query") as entry:
+        with entry['timer'].stage('search_data'):
+            busy_wait(0.06)
+        entry['result_rows'] = 3
+
+    records = [json.loads(line) for line in open(tmp_path / 'slow.jsonl')]
+    assert [r['query'] for r in records] == ["slow query"]
+    assert records[0]['result_rows'] == 3
+    assert records[0]['timings']['search_data'] >= 0.05
+    assert 'profile' not in records[0]
+
+def test_profile_header_writes_folded_stacks(tmp_path):
+    log = make_log(tmp_path, threshold_seconds=0.0)
+    with log.track("profiled", headers={'X-Profile': '1'}):
+        busy_wait(0.05)
+
+    record = json.loads(open(tmp_path / 'slow.jsonl').readline())
+    lines = open(record['profile']).read().splitlines()
+    assert any('busy_wait' in line for line in lines)
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
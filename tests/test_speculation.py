@@ -0,0 +1,55 @@
+import threading
+from backend.speculation import SpeculativeQuery, normalize_transcript, stable_prefix
+
+class FakeHandler:
+    def __init__(self):
+        self.searches = 0
+
+    def search_data(self, query_params):
+        self.searches += 1
+        return query_params['filters'], {}
+
+class BlockingProcessor:
+    """Holds the first query until released, so later partials queue up behind it."""
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.seen = []
+
+    def process_query(self, text):
+        self.seen.append(text)
+        if len(self.seen) == 1:
+            self.started.set()
+            self.release.wait(5)
+        country = 'USA' if 'usa' in text.split() else None
+        return {'intent': 'filter', 'filters': {'country': country} if country else {}}
+
+def test_stable_prefix():
+    assert normalize_transcript("How many Gold, medals?") == "how many gold medals"
+    assert stable_prefix("how many gold", "how many golf medals") == "how many"
+    assert stable_prefix("", "how many") == ""
+    assert stable_prefix("medals for usa in", "medals for usa in 2008") == "medals for usa in"
+
+def test_superseded_partials_are_skipped_and_the_latest_is_kept():
+    processor, handler = BlockingProcessor(), FakeHandler()
+    speculation = SpeculativeQuery(processor, handler, lambda text, params: params)
+    speculation.submit("medals")
+    assert processor.started.wait(5)
+    speculation.submit("medals for")
+    speculation.submit("medals for usa")
+    processor.release.set()
+    result = speculation.finish()
+    assert processor.seen == ["medals", "medals for usa"]
+    assert speculation.runs == 2
+    assert result['text'] == "medals for usa"
+    assert result['results'] == {'country': 'USA'}
+
+def test_same_search_reuses_results():
+    processor, handler = BlockingProcessor(), FakeHandler()
+    processor.release.set()
+    speculation = SpeculativeQuery(processor, handler, lambda text, params: params)
+    speculation.submit("medals for usa")
+    speculation.submit("medals for usa please")
+    result = speculation.finish()
+    assert speculation.runs == 2 and handler.searches == 1
+    assert result['text'] == "medals for usa please"
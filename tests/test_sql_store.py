@@ -0,0 +1,107 @@
+import pytest
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from backend.data_handler import DataHandler
+
+@pytest.fixture
+def sample_data():
+    return pd.DataFrame({
+        'Name': ['Michael Phelps', 'Usain Bolt', 'Simone Biles', 'Liu Xiang', 'Katie Ledecky', 'Ryan Lochte'],
+        'Team': ['USA', 'Jamaica', 'USA', 'China', 'USA', 'USA'],
+        'Year': [2008, 2012, 2016, 2008, 2020, 2008],
+        'City': ['Beijing', 'London', 'Rio', 'Beijing', 'Tokyo', 'Beijing'],
+        'Gold': [8, 3, 4, 1, 2, 2],
+        'Silver': [0, 0, 0, 0, 1, 1]
+    })
+
+@pytest.fixture
+def handlers(sample_data, tmp_path):
+    pandas_handler = DataHandler(df=sample_data)
+    sqlite_handler = DataHandler(df=sample_data, engine="sqlite", db_path=str(tmp_path / "data.sqlite"))
+    return pandas_handler, sqlite_handler
+
+@pytest.mark.parametrize("query_params", [
+    {'intent': 'filter', 'filters': {'country': 'USA', 'year': '2008'}},
+    {'intent': 'filter', 'filters': {'city': 'beijing', 'medal_type': 'silver'}},
+    {'intent': 'filter', 'filters': {'athlete': 'Bolt'}},
+    {'intent': 'ranking', 'filters': {'country': 'USA'}, 'limit': 2},
+    {'intent': 'filter', 'filters': {'country': 'Norway'}},
+    {'intent': 'filter', 'filters': {'country': 'USA', 'ranges': {'year': [('>=', 2012.0), ('<=', 2016.0)]}}},
+    {'intent': 'filter', 'filters': {'ranges': {'year': [('>', 2008.0)]}, 'medal_type': 'silver'}},
+])
+def test_sqlite_matches_pandas(handlers, query_params):
+    pandas_handler, sqlite_handler = handlers
+    expected, expected_info = pandas_handler.search_data(query_params)
+    actual, actual_info = sqlite_handler.search_data(query_params)
+    assert actual_info == expected_info
+    if not expected.empty:
+        assert_frame_equal(actual, expected, check_dtype=False, check_index_type=False)
+
+def test_results_stream_in_chunks(handlers):
+    _, sqlite_handler = handlers
+    chunks = list(sqlite_handler.iter_search_data({'filters': {'country': 'USA'}}, chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2]
+    assert sqlite_handler.data_schema['shape'] == (6, 6)
+
+def test_range_filters_use_sorted_index(handlers):
+    pandas_handler, _ = handlers
+    results, info = pandas_handler.search_data({'filters': {'ranges': {'year': [('<', 2016.0)]}, 'city': 'beijing'}})
+    assert info == {"record_count": 3}
+    assert list(results.index) == [0, 3, 5]
+    assert 'Year' in pandas_handler.sorted_indexes
+
+def test_planner_answers_selective_ranges_from_the_index(handlers):
+    pandas_handler, _ = handlers
+    results, info = pandas_handler.search_data({
+        'filters': {'ranges': {'year': [('>', 2012.0)]}, 'city': 'o'}, 'explain': True
+    })
+    assert info['record_count'] == 2
+    assert list(results.index) == [2, 4]
+    steps = info['plan']['steps']
+    assert steps[0]['step'] == 'range' and steps[0]['path'] == 'index'
+    assert [step['actual_rows'] for step in steps] == [2, 2]
+
+def test_explain_orders_filters_by_selectivity(handlers):
+    pandas_handler, _ = handlers
+    results, info = pandas_handler.search_data({
+        'filters': {'country': 'USA', 'athlete': 'Ledecky', 'year': '2020'}, 'explain': True
+    })
+    steps = info['plan']['steps']
+    assert [step['step'] for step in steps] == ['athlete', 'range', 'country']
+    assert steps[1]['path'] == 'scan'
+    assert [step['actual_rows'] for step in steps] == [1, 1, 1]
+    assert info['record_count'] == 1 and info['plan']['result_rows'] == 1
+
+def test_database_is_reingested_when_source_changes(sample_data, tmp_path):
+    db_path = str(tmp_path / "data.sqlite")
+    DataHandler(df=sample_data, engine="sqlite", db_path=db_path)
+    handler = DataHandler(df=sample_data.head(2), engine="sqlite", db_path=db_path)
+    results, _ = handler.search_data({'filters': {'country': 'USA'}})
+    assert list(results['Name']) == ['Michael Phelps']
+
+@pytest.mark.parametrize("query_params", [
+    {'intent': 'filter', 'filters': {'country': 'USA'}},
+    {'intent': 'ranking', 'filters': {}, 'limit': 5},
+])
+def test_pages_match_between_engines(handlers, query_params):
+    for handler in handlers:
+        expected, _ = handler.search_data(query_params)
+        rows, page = [], {'next_offset': 0, 'next_cursor': None}
+        while page['next_offset'] is not None:
+            page, info = handler.search_page(query_params, page_size=2, offset=page['next_offset'], cursor=page['next_cursor'])
+            assert page['total'] == info['record_count'] == len(expected)
+            assert len(page['rows']) <= 2
+            rows.append(page['rows'])
+        assert_frame_equal(pd.concat(rows), expected, check_dtype=False, check_index_type=False)
+        assert page['columns'] == list(expected.columns)
+
+def test_page_returns_session_row_ids(handlers):
+    for handler in handlers:
+        page, _ = handler.search_page({'filters': {'country': 'USA'}}, page_size=1, row_ids=True)
+        assert list(page['rows'].index) == [0]
+        assert list(page['row_ids']) == [0, 2, 4, 5]
+
+def test_unknown_range_operator_is_rejected(handlers):
+    _, sqlite_handler = handlers
+    with pytest.raises(ValueError):
+        sqlite_handler.store.compile({'filters': {'ranges': {'year': [('> 0 OR 1 =', 2008.0)]}}})
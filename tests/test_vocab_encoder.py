@@ -0,0 +1,31 @@
+import numpy as np
+from backend.stub_models import StubEmbeddingModel
+from backend.vocab_encoder import encode_vocabularies, length_batches
+from config import EMBEDDING
+
+VOCABULARIES = {
+    'country': ['USA', 'China', 'Great Britain', 'Paris'],
+    'city': ['Paris', 'Los Angeles', 'Rio de Janeiro'],
+    'athlete': [f"Athlete Number {i}" for i in range(40)],
+    'sport': []
+}
+
+def test_length_batches():
+    assert length_batches(['ccc', 'a', 'bb', 'dddd'], 3) == [['a', 'bb', 'ccc'], ['dddd']]
+
+def test_names_are_deduplicated_and_aligned():
+    model = StubEmbeddingModel()
+    embeddings, stats = encode_vocabularies(VOCABULARIES, model, processes=1, batch_size=8)
+    assert stats['names'] == 46 and stats['duplicates'] == 1 and stats['processes'] == 1
+    assert embeddings['sport'] is None
+    for entity_type in ('country', 'city', 'athlete'):
+        np.testing.assert_allclose(embeddings[entity_type], model.encode(VOCABULARIES[entity_type]), atol=1e-6)
+
+def test_pool_matches_in_process(monkeypatch):
+    monkeypatch.setitem(EMBEDDING, 'encode_parallel_min', 0)
+    model = StubEmbeddingModel()
+    expected, _ = encode_vocabularies(VOCABULARIES, model, processes=1, batch_size=8)
+    embeddings, stats = encode_vocabularies(VOCABULARIES, model, processes=2, batch_size=8)
+    assert stats['processes'] == 2
+    for entity_type in ('country', 'city', 'athlete'):
+        np.testing.assert_allclose(embeddings[entity_type], expected[entity_type], atol=1e-6)
@@ -0,0 +1,45 @@
+import pandas as pd
+from backend.data_handler import DataHandler
+from backend.warm_set import QueryLog, WarmSet, build_warm_set, start_rebuild
+
+class FakeResponder:
+    """Stands in for ResponseGenerator without loading the LLM."""
+    def generate_response(self, query, results, entities, intent):
+        return f"{len(results)} rows for {query}"
+
+def make_params(filters, follow_up=False):
+    return {'intent': 'filter', 'filters': filters, 'entities': dict(filters), 'follow_up': follow_up}
+
+def test_frequent_searches_are_served_warm(tmp_path):
+    df = pd.DataFrame({'Team': ['USA', 'China', 'USA'], 'Year': [2008, 2008, 2012], 'Gold': [36, 48, 46]})
+    log = QueryLog(path=str(tmp_path / "log.jsonl"))
+    for query in ["USA medals in 2008?", "usa medals in 2008", "Medals for USA, 2008"]:
+        log.append(query, make_params({'country': 'USA', 'year': '2008'}), dataset="v1")
+    log.append("China medals", make_params({'country': 'China'}), dataset="v1")
+    log.append("USA medals in 2008", make_params({'country': 'USA', 'year': '2008'}), dataset="v0")
+
+    searches = log.mine("v1", top_n=10, min_count=2)
+    assert [(s['query'], s['count']) for s in searches] == [("usa medals in 2008", 3)]
+
+    build_warm_set(searches, DataHandler(df=df), FakeResponder(), "v1", directory=str(tmp_path), llm="stub:model")
+    warm_set = WarmSet(directory=str(tmp_path), llm="stub:model")
+    assert warm_set.refresh("v1")
+
+    hit = warm_set.lookup(make_params({'year': '2008', 'country': 'USA'}, follow_up=True))
+    assert hit['response'] == "1 rows for usa medals in 2008"
+    assert list(hit['row_ids']) == [0]
+    assert warm_set.lookup(make_params({'country': 'China'})) is None
+    assert warm_set.stats()['warm_share'] == 0.5
+
+    # Answers generated by another model are not served
+    other = WarmSet(directory=str(tmp_path), llm="ctransformers:model")
+    other.refresh("v1")
+    assert other.stats()['entries'] == 0
+
+def test_rebuild_runs_outside_the_repository_root(tmp_path, monkeypatch):
+    csv_path = tmp_path / "summer.csv"
+    pd.DataFrame({'Team': ['USA'], 'Year': [2008], 'Gold': [36]}).to_csv(csv_path, index=False)
+    monkeypatch.chdir(tmp_path)
+    process = start_rebuild("summer.csv")
+    # An empty query log mines nothing, so the job exits before loading a model
+    assert process.wait(timeout=60) == 0